@@ -13,10 +13,26 @@ import yfinance as yf
 import pytz
 import json
 import re
+import copy
 import hashlib
+import secrets
+import io
+import os
+import tempfile
 import time as time_module
 import streamlit.components.v1 as components
 
+from market_universe import NSE_STOCKS, BSE_STOCKS, STOCK_CATEGORIES, INDICES
+from quote_store import QuoteTable, DEFAULT_SHM_NAME, QUOTE_FIELDS, fetch_quotes
+from history_store import (HistoryStore, HISTORY_MEMORY_ROWS, PARQUET_AVAILABLE, empty_frame, make_row,
+                           concat_frames, format_times, from_records, memory_report, HISTORY_KINDS, now_ts, count_history, query_history,
+                           iter_history, write_statement)
+from tick_stream import CandleAggregator, TickSimulator, TickFeed, TIMEFRAMES
+from tax_lots import LotBook
+from options_analytics import UNDERLYINGS, build_chain, chain_table, upcoming_expiries
+from risk_checks import ExposureBook
+from session_replay import ReplaySession, available_sessions, REPLAY_DIR, MIN_SPEED, MAX_SPEED
+
 # Try to import razorpay (optional for demo)
 try:
     import razorpay
@@ -84,10 +100,12 @@ st.markdown("""
 def init_session_state():
     defaults = {
         'logged_in': False, 'user_data': {}, 'users_db': {},
-        'portfolio': pd.DataFrame(columns=['Symbol', 'Name', 'Exchange', 'Quantity', 'Buy Price', 'Current Price', 'Investment', 'Current Value', 'P&L', 'P&L %']),
-        'mutual_funds': pd.DataFrame(columns=['Fund Name', 'Units', 'NAV', 'Investment', 'Current Value', 'P&L', 'P&L %']),
-        'orders': pd.DataFrame(columns=['Time', 'Type', 'Symbol', 'Exchange', 'Order Type', 'Quantity', 'Price', 'Status']),
-        'transactions': pd.DataFrame(columns=['Time', 'Type', 'Amount', 'Description', 'Balance']),
+        'portfolio': empty_frame('portfolio'),
+        'mutual_funds': empty_frame('mutual_funds'),
+        'orders': empty_frame('orders'),
+        'transactions': empty_frame('transactions'),
+        'realized': empty_frame('realized'),
+        'lot_book': LotBook(),
         'balance': 0.00,
         'watchlist': ['RELIANCE.NS', 'TCS.NS', 'INFY.NS', 'HDFCBANK.NS', 'ICICIBANK.NS'],
         'auto_refresh': True, 'refresh_interval': 30
@@ -102,21 +120,6 @@ init_session_state()
 # Market data
 IST = pytz.timezone('Asia/Kolkata')
 
-# Import all stocks from stock database
-try:
-    from stock_database import ALL_NSE_STOCKS, ALL_BSE_STOCKS, STOCK_CATEGORIES
-    NSE_STOCKS = ALL_NSE_STOCKS
-    BSE_STOCKS = ALL_BSE_STOCKS
-except ImportError:
-    # Fallback to basic stocks if database not available
-    NSE_STOCKS = {
-        'RELIANCE.NS': 'Reliance Industries Ltd', 'TCS.NS': 'Tata Consultancy Services Ltd',
-        'HDFCBANK.NS': 'HDFC Bank Ltd', 'INFY.NS': 'Infosys Ltd',
-        'ICICIBANK.NS': 'ICICI Bank Ltd', 'SBIN.NS': 'State Bank of India',
-    }
-    BSE_STOCKS = {k.replace('.NS', '.BO'): v for k, v in NSE_STOCKS.items()}
-    STOCK_CATEGORIES = {}
-
 MUTUAL_FUNDS = {
     'SBI Bluechip Fund': {'nav': 75.50, 'returns_1y': 18.5, 'category': 'Large Cap'},
     'HDFC Mid-Cap Fund': {'nav': 125.30, 'returns_1y': 22.3, 'category': 'Mid Cap'},
@@ -124,8 +127,6 @@ MUTUAL_FUNDS = {
     'Axis ELSS Fund': {'nav': 68.90, 'returns_1y': 16.2, 'category': 'ELSS'},
 }
 
-INDICES = {'^NSEI': 'NIFTY 50', '^BSESN': 'SENSEX', '^NSEBANK': 'NIFTY BANK'}
-
 # Helper functions
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -174,7 +175,7 @@ def get_market_status():
     else:
         return "CLOSED", "Market Closed", "Tomorrow 09:15 AM", "#f44336"
 
-def search_stocks(query):
+def search_stocks(query, limit=20):
     if not query:
         return []
     query = query.upper()
@@ -188,7 +189,7 @@ def search_stocks(query):
         if query in symbol.upper() or query in name.upper():
             results.append({'symbol': symbol, 'name': name, 'exchange': 'BSE'})
     
-    return results[:20]
+    return results[:limit]
 
 @st.cache_data(ttl=10)
 def get_stock_data_live(symbol, period='1d', interval='1m'):
@@ -212,6 +213,99 @@ def get_stock_info_live(symbol):
     except:
         return None
 
+# Recorded-session replay (paper trading against a past day); it overrides live quotes while active.
+# The account is set aside when a replay starts and restored when it stops, so paper fills never
+# reach the real balance, holdings or tax lots. Paper history goes to paper_<kind> frames that are
+# dropped with the replay, and funds can't move until it stops.
+PAPER_ACCOUNT_KEYS = ('balance', 'portfolio', 'lot_book')
+
+def get_active_replay():
+    return st.session_state.get('replay')
+
+def start_replay(session, speed):
+    stop_replay()
+    st.session_state.paper_backup = {key: copy.deepcopy(st.session_state[key]) for key in PAPER_ACCOUNT_KEYS}
+    st.session_state.pop('risk_book', None)
+    for kind in HISTORY_KINDS:
+        st.session_state[f'paper_{kind}'] = empty_frame(kind)
+    st.session_state.replay = ReplaySession(os.path.join(REPLAY_DIR, session), speed=speed).start()
+
+def stop_replay():
+    replay = st.session_state.pop('replay', None)
+    if replay is not None:
+        replay.stop()
+    backup = st.session_state.pop('paper_backup', None)
+    if backup is not None:
+        for key, value in backup.items():
+            st.session_state[key] = value
+        st.session_state.pop('risk_book', None)
+    for kind in HISTORY_KINDS:
+        st.session_state.pop(f'paper_{kind}', None)
+
+def set_replay_speed():
+    replay = get_active_replay()
+    if replay is not None:
+        replay.clock.set_speed(st.session_state.replay_speed)
+
+@st.fragment(run_every=1)
+def render_replay_status():
+    replay = get_active_replay()
+    if replay is None:
+        return
+    replay.poll()
+    state = "finished" if replay.finished else "paused" if replay.clock.paused else f"{replay.clock.speed}x"
+    st.caption(f"⏱️ {replay.session_time():%d %b %H:%M:%S} · {state} · {replay.bars:,} bars")
+
+# Shared-memory quotes published by quote_store.py (multi-worker deployments)
+@st.cache_resource(ttl=60)
+def get_quote_table():
+    try:
+        return QuoteTable.attach(os.environ.get('QUOTE_SHM_NAME', DEFAULT_SHM_NAME))
+    except (FileNotFoundError, ValueError):
+        return None
+
+def get_shared_quote(symbol):
+    replay = get_active_replay()
+    if replay is not None and symbol in replay.quotes:
+        return replay.quotes[symbol]
+    table = get_quote_table()
+    return table.get(symbol) if table is not None else None
+
+def get_live_price(symbol):
+    quote = get_shared_quote(symbol)
+    if quote:
+        return quote['price']
+    info = get_stock_info_live(symbol)
+    if info and 'currentPrice' in info:
+        return info['currentPrice']
+    return None
+
+QUOTE_BATCH_SIZE = 100
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_quotes_batch(symbols):
+    quotes = {}
+    for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+        try:
+            for symbol, row in fetch_quotes(symbols[i:i + QUOTE_BATCH_SIZE]).items():
+                quotes[symbol] = dict(zip(QUOTE_FIELDS, row))
+        except Exception:
+            continue
+    return quotes
+
+def get_quotes_batch(symbols):
+    """Quotes for many symbols at once: shared-memory table first, one batched download for the rest."""
+    symbols = list(symbols)
+    table = get_quote_table()
+    quotes = table.get_many(symbols) if table is not None else {}
+    replay = get_active_replay()
+    if replay is not None:
+        quotes.update((s, replay.quotes[s]) for s in symbols if s in replay.quotes)
+    missing = tuple(s for s in symbols if s not in quotes)
+    if missing:
+        quotes.update(fetch_quotes_batch(missing))
+    return pd.DataFrame.from_dict(quotes, orient='index', columns=list(QUOTE_FIELDS)).reindex(symbols)
+
 def create_candlestick_chart(data, symbol):
     fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03,
                         row_heights=[0.7, 0.3], subplot_titles=(f'{symbol}', 'Volume'))
@@ -226,6 +320,76 @@ def create_candlestick_chart(data, symbol):
                      hovermode='x unified', template='plotly_white')
     return fig
 
+def update_candlestick_chart(fig, candle, seconds, capacity):
+    """Patch the newest candle into a chart built by create_candlestick_chart.
+    
+    Keeps at most `capacity` candles, dropping the oldest as new ones arrive.
+    Returns False when the candle doesn't continue the chart and it needs a rebuild.
+    """
+    price, volume = fig.data[0], fig.data[1]
+    when = pd.Timestamp(candle.time, unit='s', tz='UTC').tz_convert(IST)
+    if not len(price.x):
+        return False
+    last = pd.Timestamp(price.x[-1])
+    if when == last:
+        n = len(price.x) - 1
+    elif when == last + pd.Timedelta(seconds=seconds):
+        n = len(price.x)
+    else:
+        return False
+    keep = slice(max(0, n + 1 - capacity), n)
+    color = 'red' if candle.close < candle.open else 'green'
+    with fig.batch_update():
+        price.x = np.append(np.asarray(price.x)[keep], when)
+        price.open = np.append(np.asarray(price.open)[keep], candle.open)
+        price.high = np.append(np.asarray(price.high)[keep], candle.high)
+        price.low = np.append(np.asarray(price.low)[keep], candle.low)
+        price.close = np.append(np.asarray(price.close)[keep], candle.close)
+        volume.x = price.x
+        volume.y = np.append(np.asarray(volume.y)[keep], candle.volume)
+        volume.marker.color = list(volume.marker.color)[keep] + [color]
+    return True
+
+# Tick feed (TICK_FEED=simulator or a ts,symbol,price,qty CSV to replay)
+@st.cache_resource
+def get_tick_feed():
+    source = os.environ.get('TICK_FEED')
+    if not source:
+        return None
+    aggregator = CandleAggregator()
+    if source == 'simulator':
+        return TickFeed(aggregator, simulator=TickSimulator()).start()
+    return TickFeed(aggregator, replay_path=source).start()
+
+@st.fragment(run_every=2)
+def render_live_chart(symbol, reference_price):
+    replay = get_active_replay()
+    if replay is not None:
+        aggregator = replay.aggregator
+    else:
+        feed = get_tick_feed()
+        if feed.simulator is not None and reference_price:
+            feed.simulator.track(symbol, reference_price)
+        aggregator = feed.aggregator
+    
+    timeframes = list(aggregator.timeframes)
+    if st.session_state.get('live_chart_tf') not in timeframes:
+        st.session_state.pop('live_chart_tf', None)
+    timeframe = st.radio("Candles", timeframes, index=timeframes.index('1m'), horizontal=True, key="live_chart_tf")
+    candle = aggregator.last(symbol, timeframe)
+    if candle is None:
+        st.caption("⏳ Waiting for ticks...")
+        return
+    
+    # Reuse the figure and push only the updated last candle into it
+    chart = st.session_state.get('live_chart')
+    if chart is None or chart['key'] != (symbol, timeframe) or \
+            not update_candlestick_chart(chart['fig'], candle, TIMEFRAMES[timeframe], aggregator.capacity):
+        data = aggregator.frame(symbol, timeframe)
+        chart = {'key': (symbol, timeframe), 'fig': create_candlestick_chart(data, symbol)}
+        st.session_state.live_chart = chart
+    st.plotly_chart(chart['fig'], use_container_width=True)
+
 # Payment Gateway Integration
 class RazorpayGateway:
     def __init__(self):
@@ -283,44 +447,87 @@ def validate_ifsc(ifsc):
         return False, "Invalid IFSC format"
     return True, ""
 
+# History storage
+@st.cache_resource
+def get_history_store():
+    try:
+        return HistoryStore()
+    except Exception:
+        return None
+
+def record_history(kind, row):
+    """Prepend a row to a history frame, spilling the oldest rows to disk past the cap."""
+    if get_active_replay() is not None:
+        # Paper history stays in the session and is dropped with the replay
+        st.session_state[f'paper_{kind}'] = concat_frames([row, st.session_state[f'paper_{kind}']])
+        return
+    frame = concat_frames([row, st.session_state[kind]])
+    owner = st.session_state.user_data.get('account_id')
+    store = get_history_store()
+    if store is not None and owner:
+        frame = store.cap(owner, kind, frame, HISTORY_MEMORY_ROWS)
+    st.session_state[kind] = frame
+
+# Pre-trade risk
+def get_risk_book():
+    """Session exposure book, rebuilt from the portfolio if cash drifted (login, external credit)."""
+    book = st.session_state.get('risk_book')
+    if book is None or abs(book.cash - st.session_state.balance) > 0.01:
+        book = ExposureBook.from_portfolio(st.session_state.balance, st.session_state.portfolio)
+        st.session_state.risk_book = book
+    return book
+
 # Transaction functions
 def add_funds(amount, method, payment_id=None):
-    new_transaction = pd.DataFrame({
-        'Time': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-        'Type': ['Credit'],
-        'Amount': [amount],
-        'Description': [f'Funds added via {method}' + (f' - {payment_id}' if payment_id else '')],
-        'Balance': [st.session_state.balance + amount]
+    if get_active_replay() is not None:
+        return False
+    
+    new_transaction = make_row('transactions', {
+        'Time': now_ts(),
+        'Type': 'Credit',
+        'Amount': amount,
+        'Description': f'Funds added via {method}' + (f' - {payment_id}' if payment_id else ''),
+        'Balance': st.session_state.balance + amount
     })
     
+    get_risk_book().deposit(amount)
     st.session_state.balance += amount
-    st.session_state.transactions = pd.concat([new_transaction, st.session_state.transactions], ignore_index=True)
+    record_history('transactions', new_transaction)
     st.session_state.user_data['balance'] = st.session_state.balance
+    return True
 
 def withdraw_funds(amount, bank_account):
-    if amount > st.session_state.balance:
+    # The balance during a replay is the paper one, and stop_replay would overwrite any change
+    if get_active_replay() is not None or amount > st.session_state.balance:
         return False
     
-    new_transaction = pd.DataFrame({
-        'Time': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-        'Type': ['Debit'],
-        'Amount': [amount],
-        'Description': [f'Withdrawal to {bank_account.get("bank_name", "Bank")} - XXXX{bank_account["account_number"][-4:]}'],
-        'Balance': [st.session_state.balance - amount]
+    new_transaction = make_row('transactions', {
+        'Time': now_ts(),
+        'Type': 'Debit',
+        'Amount': amount,
+        'Description': f'Withdrawal to {bank_account.get("bank_name", "Bank")} - XXXX{bank_account["account_number"][-4:]}',
+        'Balance': st.session_state.balance - amount
     })
     
+    get_risk_book().withdraw(amount)
     st.session_state.balance -= amount
-    st.session_state.transactions = pd.concat([new_transaction, st.session_state.transactions], ignore_index=True)
+    record_history('transactions', new_transaction)
     st.session_state.user_data['balance'] = st.session_state.balance
     return True
 
 def place_stock_order(symbol, name, exchange, order_type, quantity, price):
-    new_order = pd.DataFrame({
-        'Time': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-        'Type': ['Stock'], 'Symbol': [symbol], 'Exchange': [exchange],
-        'Order Type': [order_type], 'Quantity': [quantity], 'Price': [price], 'Status': ['Executed']
+    # During a replay fills are paper trades stamped with the replayed session's time
+    replay = get_active_replay()
+    ts = int(replay.clock.now()) if replay is not None else now_ts()
+    tag = 'Paper: ' if replay is not None else ''
+    risk_book = get_risk_book()
+    new_order = make_row('orders', {
+        'Time': ts,
+        'Type': 'Stock', 'Symbol': symbol, 'Exchange': exchange,
+        'Order Type': order_type, 'Quantity': quantity, 'Price': price,
+        'Status': 'Paper' if replay is not None else 'Executed'
     })
-    st.session_state.orders = pd.concat([new_order, st.session_state.orders], ignore_index=True)
+    record_history('orders', new_order)
     
     if order_type == 'BUY':
         total_cost = quantity * price
@@ -334,21 +541,24 @@ def place_stock_order(symbol, name, exchange, order_type, quantity, price):
             st.session_state.portfolio.loc[idx, 'Quantity'] = existing_qty + quantity
             st.session_state.portfolio.loc[idx, 'Buy Price'] = new_avg_price
         else:
-            new_position = pd.DataFrame({
-                'Symbol': [symbol], 'Name': [name], 'Exchange': [exchange],
-                'Quantity': [quantity], 'Buy Price': [price], 'Current Price': [price],
-                'Investment': [quantity * price], 'Current Value': [quantity * price],
-                'P&L': [0], 'P&L %': [0]
+            new_position = make_row('portfolio', {
+                'Symbol': symbol, 'Name': name, 'Exchange': exchange,
+                'Quantity': quantity, 'Buy Price': price, 'Current Price': price,
+                'Investment': quantity * price, 'Current Value': quantity * price,
+                'P&L': 0.0, 'P&L %': 0.0
             })
-            st.session_state.portfolio = pd.concat([st.session_state.portfolio, new_position], ignore_index=True)
+            st.session_state.portfolio = concat_frames([st.session_state.portfolio, new_position])
         
-        new_transaction = pd.DataFrame({
-            'Time': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-            'Type': ['Debit'], 'Amount': [total_cost],
-            'Description': [f'Bought {quantity} shares of {symbol}'],
-            'Balance': [st.session_state.balance]
+        st.session_state.lot_book.buy(symbol, quantity, price, ts)
+        risk_book.on_fill(symbol, order_type, quantity, price)
+        
+        new_transaction = make_row('transactions', {
+            'Time': ts,
+            'Type': 'Debit', 'Amount': total_cost,
+            'Description': f'{tag}Bought {quantity} shares of {symbol}',
+            'Balance': st.session_state.balance
         })
-        st.session_state.transactions = pd.concat([new_transaction, st.session_state.transactions], ignore_index=True)
+        record_history('transactions', new_transaction)
     
     elif order_type == 'SELL':
         if symbol in st.session_state.portfolio['Symbol'].values:
@@ -363,27 +573,259 @@ def place_stock_order(symbol, name, exchange, order_type, quantity, price):
                 if st.session_state.portfolio.loc[idx, 'Quantity'] == 0:
                     st.session_state.portfolio = st.session_state.portfolio.drop(idx).reset_index(drop=True)
                 
-                new_transaction = pd.DataFrame({
-                    'Time': [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-                    'Type': ['Credit'], 'Amount': [total_credit],
-                    'Description': [f'Sold {quantity} shares of {symbol}'],
-                    'Balance': [st.session_state.balance]
+                st.session_state.lot_book.sell(symbol, quantity, price, ts)
+                realized = st.session_state.lot_book.take_realized().rename(columns={'Sell Time': 'Time'})
+                record_history('realized', from_records('realized', realized.iloc[::-1]))
+                risk_book.on_fill(symbol, order_type, quantity, price)
+                
+                new_transaction = make_row('transactions', {
+                    'Time': ts,
+                    'Type': 'Credit', 'Amount': total_credit,
+                    'Description': f'{tag}Sold {quantity} shares of {symbol}',
+                    'Balance': st.session_state.balance
                 })
-                st.session_state.transactions = pd.concat([new_transaction, st.session_state.transactions], ignore_index=True)
+                record_history('transactions', new_transaction)
 
 def update_portfolio_prices():
-    if not st.session_state.portfolio.empty:
-        for idx, row in st.session_state.portfolio.iterrows():
-            info = get_stock_info_live(row['Symbol'])
-            if info and 'currentPrice' in info:
-                current_price = info['currentPrice']
-                st.session_state.portfolio.loc[idx, 'Current Price'] = current_price
-                current_value = current_price * row['Quantity']
-                investment = row['Buy Price'] * row['Quantity']
-                st.session_state.portfolio.loc[idx, 'Current Value'] = current_value
-                st.session_state.portfolio.loc[idx, 'Investment'] = investment
-                st.session_state.portfolio.loc[idx, 'P&L'] = current_value - investment
-                st.session_state.portfolio.loc[idx, 'P&L %'] = ((current_value - investment) / investment) * 100
+    portfolio = st.session_state.portfolio
+    if portfolio.empty:
+        return
+    prices = get_quotes_batch(sorted(portfolio['Symbol'].astype(str).unique()))['price']
+    current_price = portfolio['Symbol'].map(prices).astype('float64').fillna(portfolio['Current Price'])
+    investment = portfolio['Buy Price'] * portfolio['Quantity']
+    current_value = current_price * portfolio['Quantity']
+    portfolio['Current Price'] = current_price
+    portfolio['Investment'] = investment
+    portfolio['Current Value'] = current_value
+    portfolio['P&L'] = current_value - investment
+    portfolio['P&L %'] = (current_value - investment) / investment * 100
+
+# Options chain display formats, applied client-side
+OPTION_CHAIN_COLUMN_CONFIG = {
+    f'{side} {field}': st.column_config.NumberColumn(f'{side} {field}', format=fmt)
+    for side in ['CE', 'PE']
+    for field, fmt in {'Price': "₹%.2f", 'Delta': "%.3f", 'Gamma': "%.5f",
+                       'Theta': "%.2f", 'Vega': "%.2f"}.items()
+}
+OPTION_CHAIN_COLUMN_CONFIG['Strike'] = st.column_config.NumberColumn("Strike", format="%.0f")
+
+# Watchlist board
+WATCHLIST_REFRESH_SECONDS = 10
+
+def _watchlist_styles(board, changed):
+    up = board['Change %'].to_numpy() >= 0
+    styles = np.full(board.shape, '', dtype=object)
+    price_cols = [board.columns.get_loc(c) for c in ['Price', 'Change %']]
+    tint = np.where(up, 'background-color: #c8e6c9', 'background-color: #ffcdd2')
+    for col in price_cols:
+        styles[:, col] = np.where(changed, tint, '')
+    return pd.DataFrame(styles, index=board.index, columns=board.columns)
+
+def remove_from_watchlist():
+    remove = st.session_state.watchlist_remove
+    st.session_state.watchlist = [s for s in st.session_state.watchlist if s not in remove]
+    st.session_state.watchlist_remove = []
+
+@st.fragment(run_every=WATCHLIST_REFRESH_SECONDS)
+def render_watchlist_board():
+    """All watchlist quotes from one batched fetch in a single table, changed prices highlighted."""
+    symbols = list(dict.fromkeys(st.session_state.watchlist))
+    if not symbols:
+        st.info("Watchlist empty - add stocks with ➕")
+        return
+    
+    quotes = get_quotes_batch(symbols)
+    board = pd.DataFrame({
+        'Symbol': [s.split('.')[0] for s in symbols],
+        'Name': [NSE_STOCKS.get(s) or BSE_STOCKS.get(s) or INDICES.get(s, s) for s in symbols],
+        'Exchange': ['BSE' if s.endswith('.BO') else 'NSE' for s in symbols],
+        'Price': quotes['price'].to_numpy(),
+        'Change %': quotes['change_pct'].to_numpy(),
+    }, index=symbols)
+    
+    # Only cells whose price moved since this session's last refresh are highlighted
+    previous = st.session_state.get('watchlist_prices')
+    last = previous.reindex(board.index).to_numpy() if previous is not None else np.full(len(board), np.nan)
+    changed = ~np.isnan(last) & (board['Price'].to_numpy() != last)
+    st.session_state.watchlist_prices = board['Price']
+    
+    styled = board.style.apply(_watchlist_styles, axis=None, changed=changed) \
+        .format({'Price': '₹{:,.2f}', 'Change %': '{:+.2f}%'}, na_rep='-')
+    st.dataframe(styled, use_container_width=True, hide_index=True)
+    st.caption(f"{len(symbols)} symbols | {int(changed.sum())} updated | "
+               f"refreshes every {WATCHLIST_REFRESH_SECONDS}s")
+    
+    col_remove, col_btn = st.columns([3, 1])
+    with col_remove:
+        remove = st.multiselect("Remove from watchlist", symbols, key="watchlist_remove")
+    with col_btn:
+        st.write("")
+        st.button("🗑️ Remove", use_container_width=True, disabled=not remove, on_click=remove_from_watchlist)
+
+# Market table (MARKET_LAYOUT=rows keeps the old per-row widget grid for comparison)
+MARKET_LAYOUT = os.environ.get('MARKET_LAYOUT', 'table')
+MARKET_TABLE_MAX_ROWS = 500
+
+MARKET_COLUMN_CONFIG = {
+    'Price': st.column_config.NumberColumn("Price", format="₹%.2f"),
+    'Change %': st.column_config.NumberColumn("Change %", format="%+.2f%%"),
+    'Volume': st.column_config.NumberColumn("Volume", format="%d"),
+}
+
+def market_results(symbols):
+    return [{'symbol': s, 'name': NSE_STOCKS.get(s) or BSE_STOCKS[s], 'exchange': 'BSE' if s.endswith('.BO') else 'NSE'}
+            for s in symbols]
+
+@st.fragment(run_every=WATCHLIST_REFRESH_SECONDS)
+def render_market_table(results):
+    """Stocks with live quotes in one scrollable table; selected rows drive the watchlist and trade actions."""
+    shown = results[:MARKET_TABLE_MAX_ROWS]
+    symbols = [r['symbol'] for r in shown]
+    quotes = get_quotes_batch(symbols)
+    table = pd.DataFrame({
+        'Symbol': [s.split('.')[0] for s in symbols],
+        'Name': [r['name'] for r in shown],
+        'Exchange': [r['exchange'] for r in shown],
+        'Price': quotes['price'].to_numpy(),
+        'Change %': quotes['change_pct'].to_numpy(),
+        'Volume': quotes['volume'].to_numpy(),
+    })
+    
+    # Keyed on the result set so a new search starts with a fresh selection, while price refreshes keep it
+    event = st.dataframe(table, use_container_width=True, hide_index=True, height=420,
+                         column_config=MARKET_COLUMN_CONFIG, on_select="rerun", selection_mode="multi-row",
+                         key=f"market_table_{hash(tuple(symbols))}")
+    selected = [shown[i] for i in event.selection.rows if i < len(shown)]
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        more = f" (first {len(shown)} of {len(results)}, refine the search)" if len(results) > len(shown) else ""
+        st.caption(f"{len(selected)} selected{more} | prices refresh every {WATCHLIST_REFRESH_SECONDS}s")
+    with col2:
+        if st.button("➕ Watchlist", use_container_width=True, disabled=not selected, key="market_add"):
+            st.session_state.watchlist += [r['symbol'] for r in selected
+                                           if r['symbol'] not in st.session_state.watchlist]
+            st.rerun()
+    with col3:
+        if st.button("💱 Trade", use_container_width=True, disabled=len(selected) != 1, key="market_trade"):
+            st.session_state.selected_trade_stock = selected[0]
+            st.rerun()
+
+def render_market_rows(filtered_results):
+    """Legacy layout: one row of widgets per stock, 20 to a page."""
+    stocks_per_page = 20
+    total_pages = (len(filtered_results) - 1) // stocks_per_page + 1
+
+    if total_pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=total_pages, value=1)
+    else:
+        page = 1
+
+    start_idx = (page - 1) * stocks_per_page
+    end_idx = min(start_idx + stocks_per_page, len(filtered_results))
+
+    for result in filtered_results[start_idx:end_idx]:
+        col1, col2, col3, col4, col5 = st.columns([2, 4, 1, 1, 1])
+
+        with col1:
+            st.write(f"**{result['symbol'].split('.')[0]}**")
+        with col2:
+            st.write(result['name'][:50])
+        with col3:
+            # Get live price
+            live_price = get_live_price(result['symbol'])
+            if live_price is not None:
+                st.write(f"₹{live_price:.2f}")
+            else:
+                st.write("-")
+        with col4:
+            st.write(result['exchange'])
+        with col5:
+            if st.button("➕", key=f"add_{result['symbol']}", help="Add to watchlist"):
+                if result['symbol'] not in st.session_state.watchlist:
+                    st.session_state.watchlist.append(result['symbol'])
+                    st.success(f"Added!")
+                    time_module.sleep(0.5)
+                    st.rerun()
+
+    if total_pages > 1:
+        st.write(f"Page {page} of {total_pages}")
+
+# History views
+HISTORY_PAGE_SIZE = 50
+STATEMENT_SPOOL_BYTES = 8 * 1024 * 1024  # larger statements spill to a temp file
+
+HISTORY_COLUMN_CONFIG = {
+    'Time': st.column_config.DatetimeColumn("Time", format="YYYY-MM-DD HH:mm:ss"),
+    'Price': st.column_config.NumberColumn("Price", format="₹%.2f"),
+    'Amount': st.column_config.NumberColumn("Amount", format="₹%.2f"),
+    'Balance': st.column_config.NumberColumn("Balance", format="₹%.2f"),
+    'Buy Time': st.column_config.DatetimeColumn("Buy Time", format="YYYY-MM-DD HH:mm:ss"),
+    'Buy Price': st.column_config.NumberColumn("Buy Price", format="₹%.2f"),
+    'Sell Price': st.column_config.NumberColumn("Sell Price", format="₹%.2f"),
+    'P&L': st.column_config.NumberColumn("P&L", format="₹%.2f"),
+}
+
+def render_history(kind, label, time_label="Time"):
+    """Filtered, paginated history table with a chunked statement export."""
+    if get_active_replay() is not None:
+        st.caption("⏪ Paper trades from the current replay")
+        store, owner, frame = None, None, st.session_state[f'paper_{kind}']
+    else:
+        store = get_history_store()
+        owner = st.session_state.user_data.get('account_id')
+        frame = st.session_state[kind]
+    
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        today = datetime.now(IST).date()
+        date_range = st.date_input("Date range", value=(today - timedelta(days=30), today), key=f"{kind}_range")
+    with col2:
+        symbol = None
+        if 'Symbol' in frame.columns:
+            known = set(frame['Symbol'].dropna().unique())
+            if store is not None and owner:
+                known |= store.symbols(owner, kind)
+            choice = st.selectbox("Symbol", ['All'] + sorted(known), key=f"{kind}_symbol")
+            symbol = None if choice == 'All' else choice
+    
+    start = end = None
+    if len(date_range) == 2:
+        start = int(IST.localize(datetime.combine(date_range[0], dt_time.min)).timestamp())
+        end = int(IST.localize(datetime.combine(date_range[1], dt_time.max)).timestamp())
+    
+    total = count_history(frame, store, owner, kind, start, end, symbol)
+    if not total:
+        st.info(f"No {label.lower()} in this range")
+        return
+    
+    with col3:
+        pages = (total - 1) // HISTORY_PAGE_SIZE + 1
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=f"{kind}_page")
+    
+    rows, _ = query_history(frame, store, owner, kind, start, end, symbol,
+                            offset=(page - 1) * HISTORY_PAGE_SIZE, limit=HISTORY_PAGE_SIZE)
+    column_config = dict(HISTORY_COLUMN_CONFIG,
+                         Time=st.column_config.DatetimeColumn(time_label, format="YYYY-MM-DD HH:mm:ss"))
+    st.dataframe(format_times(rows), use_container_width=True, hide_index=True, column_config=column_config)
+    st.caption(f"{total} {label.lower()} | Page {page} of {pages}")
+    
+    formats = ['csv', 'parquet'] if PARQUET_AVAILABLE else ['csv']
+    col_fmt, col_export = st.columns([1, 2])
+    with col_fmt:
+        fmt = st.selectbox("Statement format", formats, format_func=str.upper, key=f"{kind}_fmt")
+    with col_export:
+        def build_statement():
+            # Only runs when the download is clicked; history is streamed a chunk at a time
+            statement = tempfile.SpooledTemporaryFile(max_size=STATEMENT_SPOOL_BYTES)
+            write_statement(iter_history(frame, store, owner, kind, start, end, symbol), statement, fmt)
+            statement.seek(0)
+            # st.download_button reads buffered readers directly, in memory or spilled to disk
+            return io.BufferedReader(statement)
+        
+        st.download_button(f"📄 Download {label} Statement", build_statement, file_name=f"{kind}_statement.{fmt}",
+                           mime='text/csv' if fmt == 'csv' else 'application/octet-stream',
+                           key=f"{kind}_download", use_container_width=True)
 
 # Authentication pages
 def login_page():
@@ -455,7 +897,10 @@ def register_page():
                 st.session_state.temp_user = {
                     'name': name, 'email': email, 'phone': phone,
                     'password': hash_password(password), 'pan': pan.upper(),
-                    'balance': 0, 'verified': False
+                    'balance': 0, 'verified': False,
+                    # Archived history is keyed by this, not the email: users_db is per session,
+                    # so the same email can be registered again elsewhere
+                    'account_id': secrets.token_hex(16),
                 }
                 st.session_state.show_otp = True
                 st.rerun()
@@ -550,20 +995,60 @@ def main_app():
         
         st.markdown("---")
         
+        with st.expander("⏪ Session Replay", expanded=get_active_replay() is not None):
+            sessions = available_sessions()
+            replay = get_active_replay()
+            if not sessions and replay is None:
+                st.caption(f"No recorded sessions in `{REPLAY_DIR}/`. Record one with "
+                           "`python session_replay.py record <symbols>`.")
+            else:
+                session = st.selectbox("Session", sessions, key="replay_session")
+                st.slider("Speed (x)", MIN_SPEED, MAX_SPEED, 10, key="replay_speed", on_change=set_replay_speed)
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("▶️ Start", use_container_width=True, disabled=session is None):
+                        start_replay(session, st.session_state.replay_speed)
+                        st.rerun()
+                with col2:
+                    if st.button("⏹️ Stop", use_container_width=True, disabled=replay is None):
+                        stop_replay()
+                        st.rerun()
+                if replay is not None:
+                    if replay.clock.paused:
+                        st.button("⏯️ Resume", use_container_width=True, on_click=replay.clock.resume)
+                    else:
+                        st.button("⏸️ Pause", use_container_width=True, on_click=replay.clock.pause)
+                    render_replay_status()
+        
+        st.markdown("---")
+        
         if st.button("🚪 Logout", use_container_width=True):
+            stop_replay()
             st.session_state.logged_in = False
             st.rerun()
     
+    replay = get_active_replay()
+    if replay is not None:
+        replay.poll()
+        st.info(f"⏪ Replaying {os.path.basename(replay.session_dir)} — prices are from the recorded session "
+                f"at {replay.session_time():%H:%M:%S}; orders fill as paper trades at those prices. "
+                f"Your balance and holdings are restored, and the paper history discarded, when the replay stops.")
+    
     update_portfolio_prices()
     
     # Main tabs
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📈 Market", "💼 Portfolio", "💱 Trade", "💰 Funds", "📋 Orders", "⚙️ Settings"])
+    tab1, tab2, tab3, tab_fno, tab4, tab5, tab6 = st.tabs(["📈 Market", "💼 Portfolio", "💱 Trade", "🧮 F&O", "💰 Funds", "📋 Orders", "⚙️ Settings"])
     
     with tab1:
         st.header("Live Market")
         
         col1, col2, col3 = st.columns(3)
         for idx, (symbol, name) in enumerate(INDICES.items()):
+            quote = get_shared_quote(symbol)
+            if quote:
+                with [col1, col2, col3][idx]:
+                    st.metric(name, f"{quote['price']:,.2f}", f"{quote['change_pct']:+.2f}%")
+                continue
             data = get_stock_data_live(symbol, period='1d', interval='1m')
             if data is not None and not data.empty:
                 current = data['Close'].iloc[-1]
@@ -572,6 +1057,10 @@ def main_app():
                 with [col1, col2, col3][idx]:
                     st.metric(name, f"{current:,.2f}", f"{change:+.2f}%")
         
+        st.markdown("---")
+        st.subheader("👀 Watchlist")
+        render_watchlist_board()
+        
         st.markdown("---")
         
         # Stock filtering
@@ -609,51 +1098,20 @@ def main_app():
                 st.write(f"**{category}** ({len(filtered_results)} stocks)")
             else:
                 # Search in all stocks
-                filtered_results = search_stocks(search_query)
+                filtered_results = search_stocks(search_query, limit=None if MARKET_LAYOUT == 'table' else 20)
             
             if filtered_results:
                 st.write(f"**Found {len(filtered_results)} stocks:**")
                 
-                # Show in table format with pagination
-                stocks_per_page = 20
-                total_pages = (len(filtered_results) - 1) // stocks_per_page + 1
-                
-                if total_pages > 1:
-                    page = st.number_input("Page", min_value=1, max_value=total_pages, value=1)
+                if MARKET_LAYOUT == 'rows':
+                    render_market_rows(filtered_results)
                 else:
-                    page = 1
-                
-                start_idx = (page - 1) * stocks_per_page
-                end_idx = min(start_idx + stocks_per_page, len(filtered_results))
-                
-                for result in filtered_results[start_idx:end_idx]:
-                    col1, col2, col3, col4, col5 = st.columns([2, 4, 1, 1, 1])
-                    
-                    with col1:
-                        st.write(f"**{result['symbol'].split('.')[0]}**")
-                    with col2:
-                        st.write(result['name'][:50])
-                    with col3:
-                        # Get live price
-                        info = get_stock_info_live(result['symbol'])
-                        if info and 'currentPrice' in info:
-                            st.write(f"₹{info['currentPrice']:.2f}")
-                        else:
-                            st.write("-")
-                    with col4:
-                        st.write(result['exchange'])
-                    with col5:
-                        if st.button("➕", key=f"add_{result['symbol']}", help="Add to watchlist"):
-                            if result['symbol'] not in st.session_state.watchlist:
-                                st.session_state.watchlist.append(result['symbol'])
-                                st.success(f"Added!")
-                                time_module.sleep(0.5)
-                                st.rerun()
-                
-                if total_pages > 1:
-                    st.write(f"Page {page} of {total_pages}")
+                    render_market_table(filtered_results)
             else:
                 st.warning("No stocks found. Try different search terms.")
+        elif MARKET_LAYOUT == 'table':
+            st.subheader("📋 All Stocks")
+            render_market_table(market_results(list(NSE_STOCKS) + list(BSE_STOCKS)))
         else:
             st.write("👆 **Use search or select category to find stocks**")
             
@@ -684,6 +1142,21 @@ def main_app():
             st.dataframe(display_df, use_container_width=True, hide_index=True)
         else:
             st.info("Portfolio empty")
+        
+        st.subheader("🧾 Capital Gains (FIFO)")
+        book = st.session_state.lot_book
+        gains = book.realized_summary()
+        marks = st.session_state.portfolio.set_index(st.session_state.portfolio['Symbol'].astype(str))['Current Price']
+        unrealized = book.unrealized(marks)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Realized STCG", f"₹{gains['STCG']:,.2f}")
+        with col2:
+            st.metric("Realized LTCG", f"₹{gains['LTCG']:,.2f}")
+        with col3:
+            st.metric("Unrealized P&L", f"₹{unrealized['Unrealized P&L'].sum():,.2f}")
+        
+        render_history('realized', "Realized Gains", time_label="Sell Time")
     
     with tab3:
         st.header("Trade")
@@ -703,27 +1176,61 @@ def main_app():
             col1, col2 = st.columns(2)
             with col1:
                 order_type = st.radio("Type", ["BUY", "SELL"], horizontal=True)
-                info = get_stock_info_live(stock['symbol'])
-                current_price = info.get('currentPrice', 0) if info else 0
+                current_price = get_live_price(stock['symbol']) or 0
                 st.info(f"Price: ₹{current_price:.2f}")
             
             with col2:
                 quantity = st.number_input("Quantity", min_value=1, value=1)
                 price = st.number_input("Price", min_value=0.01, value=float(current_price), step=0.01)
                 
-                if order_type == "BUY":
-                    total = quantity * price
-                    if total <= st.session_state.balance:
-                        if st.button("🛒 Buy", type="primary", use_container_width=True):
-                            place_stock_order(stock['symbol'], stock['name'], stock['exchange'], order_type, quantity, price)
-                            st.success("Order placed!")
-                            time_module.sleep(1)
-                            st.rerun()
-                    else:
-                        st.error("Insufficient balance!")
+                check = get_risk_book().check(stock['symbol'], order_type, quantity, price)
+                if check.ok:
+                    label = "🛒 Buy" if order_type == "BUY" else "💰 Sell"
+                    if st.button(label, type="primary", use_container_width=True):
+                        place_stock_order(stock['symbol'], stock['name'], stock['exchange'], order_type, quantity, price)
+                        st.success("Order placed!")
+                        time_module.sleep(1)
+                        st.rerun()
+                else:
+                    st.error(check.reason)
+            
+            if get_active_replay() is not None or get_tick_feed() is not None:
+                render_live_chart(stock['symbol'], current_price)
+    
+    with tab_fno:
+        st.header("Options Chain")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            underlying = st.selectbox("Underlying", list(UNDERLYINGS))
+        now_ist = datetime.now(IST).replace(tzinfo=None)
+        expiries = upcoming_expiries(underlying, now_ist.date())
+        with col2:
+            expiry = st.selectbox("Expiry", expiries, format_func=lambda d: d.strftime('%d %b %Y'))
+        with col3:
+            volatility = st.number_input("Volatility %", min_value=5.0, max_value=100.0, value=14.0, step=0.5)
+        with col4:
+            strikes_each_side = st.slider("Strikes each side", min_value=5, max_value=50, value=15)
+        
+        index_symbol = UNDERLYINGS[underlying]['index']
+        spot = get_live_price(index_symbol)
+        if spot:
+            st.metric(INDICES[index_symbol], f"{spot:,.2f}")
+            # Every expiry priced in one vectorized pass; the table shows the selected one
+            chain = build_chain(underlying, spot, now_ist, expiries, strikes_each_side, volatility / 100)
+            # No option quotes are fetched, so there is no implied volatility to show
+            st.dataframe(chain_table(chain, expiry, implied=False), use_container_width=True, hide_index=True,
+                         column_config=OPTION_CHAIN_COLUMN_CONFIG, height=600)
+            st.caption("Theoretical chain: Black-Scholes prices and Greeks at the chosen volatility, not market "
+                       "quotes. Theta per day, vega per 1% vol.")
+        else:
+            st.warning(f"⚠️ {INDICES[index_symbol]} quote unavailable")
     
     with tab4:
         st.header("Funds Management")
+        replaying = get_active_replay() is not None
+        if replaying:
+            st.warning("⏪ Funds can't be added or withdrawn during a replay. Stop the replay first.")
         
         tab_add, tab_withdraw = st.tabs(["➕ Add Funds", "➖ Withdraw"])
         
@@ -746,7 +1253,7 @@ def main_app():
             # Payment gateway integration
             pg = RazorpayGateway()
             
-            if st.button("💳 Pay with Razorpay", type="primary", use_container_width=True):
+            if st.button("💳 Pay with Razorpay", type="primary", use_container_width=True, disabled=replaying):
                 order = pg.create_order(amount)
                 if order:
                     st.success(f"✅ Order created: {order['id']}")
@@ -856,7 +1363,7 @@ def main_app():
                 with col2:
                     st.metric("You'll receive", f"₹{net_amount:,.2f}")
                 
-                if st.button("Process Withdrawal", type="primary", use_container_width=True):
+                if st.button("Process Withdrawal", type="primary", use_container_width=True, disabled=replaying):
                     if withdraw_funds(withdraw_amount, bank_account):
                         st.success(f"""
                         ✅ Withdrawal Initiated!
@@ -869,12 +1376,11 @@ def main_app():
     
     with tab5:
         st.header("Orders")
-        if not st.session_state.orders.empty:
-            display = st.session_state.orders.copy()
-            display['Price'] = display['Price'].apply(lambda x: f"₹{x:,.2f}")
-            st.dataframe(display, use_container_width=True, hide_index=True)
-        else:
-            st.info("No orders yet")
+        orders_tab, transactions_tab = st.tabs(["🧾 Orders", "💸 Transactions"])
+        with orders_tab:
+            render_history('orders', "Orders")
+        with transactions_tab:
+            render_history('transactions', "Transactions")
     
     with tab6:
         st.header("Settings")
@@ -884,6 +1390,13 @@ def main_app():
         st.write(f"**Email:** {st.session_state.user_data.get('email')}")
         st.write(f"**Phone:** {st.session_state.user_data.get('phone')}")
         st.write(f"**PAN:** {st.session_state.user_data.get('pan')}")
+        
+        with st.expander("🧠 Session Memory"):
+            # Deep measurement walks every object in the session, so it only runs on request
+            if st.toggle("Measure session memory", key="measure_memory"):
+                report = memory_report(st.session_state)
+                st.metric("Total", f"{report['Bytes'].sum() / 1024:,.1f} KB")
+                st.dataframe(report, use_container_width=True, hide_index=True)
 
 # Main flow
 if not st.session_state.logged_in:
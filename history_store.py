@@ -0,0 +1,333 @@
+"""
+Compact typed session frames and the on-disk store older history spills to.
+
+Session DataFrames use categorical Symbol/Exchange/Type columns, int64 epoch
+second timestamps and float64 amounts instead of object columns holding
+strings. Order, transaction and realized-gain history is capped in memory;
+rows beyond the cap move to a SQLite store and are paged back in on demand.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from market_universe import all_symbols
+
+# Parquet statements need pyarrow (optional)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+HISTORY_DB = os.environ.get('HISTORY_DB', 'history.db')
+HISTORY_MEMORY_ROWS = int(os.environ.get('HISTORY_MEMORY_ROWS', 500))
+EXPORT_CHUNK_ROWS = 5000
+
+SYMBOL_DTYPE = pd.CategoricalDtype(all_symbols())
+EXCHANGE_DTYPE = pd.CategoricalDtype(['NSE', 'BSE'])
+
+SCHEMAS = {
+    'portfolio': {
+        'Symbol': SYMBOL_DTYPE, 'Name': 'object', 'Exchange': EXCHANGE_DTYPE, 'Quantity': 'int64',
+        'Buy Price': 'float64', 'Current Price': 'float64', 'Investment': 'float64',
+        'Current Value': 'float64', 'P&L': 'float64', 'P&L %': 'float64'
+    },
+    'mutual_funds': {
+        'Fund Name': 'category', 'Units': 'float64', 'NAV': 'float64', 'Investment': 'float64',
+        'Current Value': 'float64', 'P&L': 'float64', 'P&L %': 'float64'
+    },
+    'orders': {
+        'Time': 'int64', 'Type': pd.CategoricalDtype(['Stock']), 'Symbol': SYMBOL_DTYPE,
+        'Exchange': EXCHANGE_DTYPE, 'Order Type': pd.CategoricalDtype(['BUY', 'SELL']),
+        'Quantity': 'int64', 'Price': 'float64',
+        'Status': pd.CategoricalDtype(['Executed', 'Open', 'Cancelled', 'Rejected', 'Paper'])
+    },
+    'transactions': {
+        'Time': 'int64', 'Type': pd.CategoricalDtype(['Credit', 'Debit']), 'Amount': 'float64',
+        'Description': 'object', 'Balance': 'float64'
+    },
+    # tax_lots realized rows, keyed on the sell time
+    'realized': {
+        'Time': 'int64', 'Symbol': SYMBOL_DTYPE, 'Quantity': 'int64', 'Buy Time': 'int64',
+        'Buy Price': 'float64', 'Sell Price': 'float64', 'P&L': 'float64', 'Holding Days': 'int64',
+        'Tax Class': pd.CategoricalDtype(['STCG', 'LTCG'])
+    },
+}
+
+# History kinds that spill to disk, newest row first in memory
+HISTORY_KINDS = ('orders', 'transactions', 'realized')
+
+# Epoch-second columns shown and exported as datetimes
+TIME_COLUMNS = ('Time', 'Buy Time')
+
+
+def now_ts():
+    return int(time.time())
+
+
+def empty_frame(kind):
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in SCHEMAS[kind].items()})
+
+
+def _dtype_for(dtype, value):
+    # Widen a categorical dtype when a value outside the known universe shows up
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None \
+            and value not in dtype.categories:
+        return pd.CategoricalDtype(dtype.categories.append(pd.Index([value])))
+    return dtype
+
+
+def make_row(kind, values):
+    """Single-row frame typed per SCHEMAS from a {column: value} dict."""
+    return pd.DataFrame({col: pd.Series([values[col]], dtype=_dtype_for(dtype, values[col]))
+                         for col, dtype in SCHEMAS[kind].items()})
+
+
+def concat_frames(frames):
+    """Concat keeping categorical columns categorical even if categories differ."""
+    frames = list(frames)
+    for col, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[col].cat.categories, sort=False)
+            frames = [frame if frame[col].cat.categories.equals(categories)
+                      else frame.assign(**{col: frame[col].cat.set_categories(categories)})
+                      for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def from_records(kind, frame):
+    """Restore SCHEMAS dtypes on a frame read back from disk."""
+    frame = frame[list(SCHEMAS[kind])].copy()
+    for col, dtype in SCHEMAS[kind].items():
+        if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None:
+            frame[col] = frame[col].astype(_widened(dtype, frame[col]))
+        else:
+            frame[col] = frame[col].astype(dtype)
+    return frame
+
+
+def _widened(dtype, values):
+    extra = pd.Index(values.dropna().unique()).difference(dtype.categories)
+    return pd.CategoricalDtype(dtype.categories.append(extra)) if len(extra) else dtype
+
+
+def format_time(series, tz='Asia/Kolkata'):
+    """Epoch seconds to tz-aware datetimes for display."""
+    return pd.to_datetime(series, unit='s', utc=True).dt.tz_convert(tz)
+
+
+def format_times(frame, tz='Asia/Kolkata'):
+    """format_time applied to every TIME_COLUMNS column in ``frame``."""
+    return frame.assign(**{col: format_time(frame[col], tz) for col in TIME_COLUMNS if col in frame.columns})
+
+
+_SQL_TYPES = {'int64': 'INTEGER', 'float64': 'REAL'}
+
+
+class HistoryStore:
+    """SQLite store for history rows evicted from session memory."""
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            for kind in HISTORY_KINDS:
+                columns = ', '.join(f'"{col}" {_SQL_TYPES.get(str(dtype), "TEXT")}'
+                                    for col, dtype in SCHEMAS[kind].items())
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{kind}" (owner TEXT NOT NULL, {columns})')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{kind}_owner_time" ON "{kind}" (owner, "Time")')
+                if 'Symbol' in SCHEMAS[kind]:
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{kind}_owner_symbol_time" '
+                                      f'ON "{kind}" (owner, "Symbol", "Time")')
+
+    def spill(self, owner, kind, frame):
+        if frame.empty:
+            return
+        rows = frame.astype({col: 'object' for col, dtype in frame.dtypes.items()
+                             if isinstance(dtype, pd.CategoricalDtype)})
+        columns = ', '.join(['owner'] + [f'"{col}"' for col in SCHEMAS[kind]])
+        placeholders = ', '.join('?' * (len(SCHEMAS[kind]) + 1))
+        with self.lock, self.conn:
+            self.conn.executemany(f'INSERT INTO "{kind}" ({columns}) VALUES ({placeholders})',
+                                  ((owner, *row) for row in rows[list(SCHEMAS[kind])].itertuples(index=False)))
+
+    def cap(self, owner, kind, frame, keep=HISTORY_MEMORY_ROWS):
+        """Spill everything past the newest ``keep`` rows; returns the in-memory part."""
+        if len(frame) <= keep:
+            return frame
+        self.spill(owner, kind, frame.iloc[keep:])
+        return frame.iloc[:keep].reset_index(drop=True)
+
+    def _where(self, owner, start, end, symbol):
+        clauses, params = ['owner = ?'], [owner]
+        if symbol:
+            clauses.append('"Symbol" = ?')
+            params.append(symbol)
+        if start is not None:
+            clauses.append('"Time" >= ?')
+            params.append(int(start))
+        if end is not None:
+            clauses.append('"Time" <= ?')
+            params.append(int(end))
+        return ' AND '.join(clauses), params
+
+    def count(self, owner, kind, start=None, end=None, symbol=None):
+        where, params = self._where(owner, start, end, symbol)
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM "{kind}" WHERE {where}', params).fetchone()[0]
+
+    def symbols(self, owner, kind):
+        with self.lock:
+            rows = self.conn.execute(f'SELECT DISTINCT "Symbol" FROM "{kind}" WHERE owner = ?', (owner,)).fetchall()
+        return {row[0] for row in rows}
+
+    def page(self, owner, kind, offset=0, limit=100, start=None, end=None, symbol=None):
+        """Spilled rows newest first, ``limit`` at a time, optionally filtered."""
+        where, params = self._where(owner, start, end, symbol)
+        columns = ', '.join(f'"{col}"' for col in SCHEMAS[kind])
+        with self.lock:
+            frame = pd.read_sql_query(
+                f'SELECT {columns} FROM "{kind}" WHERE {where} ORDER BY "Time" DESC LIMIT ? OFFSET ?',
+                self.conn, params=(*params, limit, offset))
+        return from_records(kind, frame)
+
+    def iter_chunks(self, owner, kind, start=None, end=None, symbol=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Stream spilled rows newest first without loading them all."""
+        where, params = self._where(owner, start, end, symbol)
+        columns = ', '.join(f'"{col}"' for col in SCHEMAS[kind])
+        # Own connection so a long export does not hold the shared lock
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(f'SELECT {columns} FROM "{kind}" WHERE {where} ORDER BY "Time" DESC', params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield from_records(kind, pd.DataFrame.from_records(rows, columns=list(SCHEMAS[kind])))
+        finally:
+            conn.close()
+
+
+def filter_frame(frame, start=None, end=None, symbol=None):
+    """Date-range/symbol filter over an in-memory history frame (newest first).
+
+    Time is sorted descending, so the range is two binary searches rather than
+    a full scan; the symbol filter compares categorical codes.
+    """
+    times = frame['Time'].to_numpy()
+    lo = 0 if end is None else np.searchsorted(-times, -int(end), side='left')
+    hi = len(times) if start is None else np.searchsorted(-times, -int(start), side='right')
+    frame = frame.iloc[lo:hi]
+    if symbol:
+        frame = frame[frame['Symbol'] == symbol]
+    return frame
+
+
+def count_history(frame, store, owner, kind, start=None, end=None, symbol=None):
+    recent = len(filter_frame(frame, start, end, symbol))
+    return recent + (store.count(owner, kind, start, end, symbol) if store is not None and owner else 0)
+
+
+def query_history(frame, store, owner, kind, start=None, end=None, symbol=None, offset=0, limit=50):
+    """One page of history, newest first, across memory and the spill store.
+
+    Spilled rows are always older than the in-memory ones, so the page is the
+    tail of the memory matches followed by the head of the disk matches.
+    Returns (page, total_matches).
+    """
+    recent = filter_frame(frame, start, end, symbol)
+    archived = store.count(owner, kind, start, end, symbol) if store is not None and owner else 0
+    page = recent.iloc[offset:offset + limit]
+    if len(page) < limit and archived:
+        older = store.page(owner, kind, offset=max(0, offset - len(recent)), limit=limit - len(page),
+                           start=start, end=end, symbol=symbol)
+        page = concat_frames([page, older])
+    return page, len(recent) + archived
+
+
+def iter_history(frame, store, owner, kind, start=None, end=None, symbol=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield matching history in chunks: memory first, then the spill store."""
+    recent = filter_frame(frame, start, end, symbol)
+    for i in range(0, len(recent), chunk_rows):
+        yield recent.iloc[i:i + chunk_rows]
+    if store is not None and owner:
+        yield from store.iter_chunks(owner, kind, start, end, symbol, chunk_rows)
+
+
+def write_statement(chunks, fileobj, fmt='csv', tz='Asia/Kolkata'):
+    """Write history chunks to a binary file object one chunk at a time."""
+    writer = None
+    header = True
+    for chunk in chunks:
+        chunk = format_times(chunk, tz)
+        if fmt == 'csv':
+            fileobj.write(chunk.to_csv(index=False, header=header).encode())
+            header = False
+        elif fmt == 'parquet':
+            if not PARQUET_AVAILABLE:
+                raise RuntimeError("Parquet export requires pyarrow")
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        else:
+            raise ValueError(f"Unknown statement format: {fmt}")
+    if writer is not None:
+        writer.close()
+
+
+# Shared by every session, so never charged to one
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                 threading.Thread)
+
+
+def deep_sizeof(value, seen=None):
+    """Approximate bytes reachable from ``value``, counting each object once.
+
+    Objects can report their own size with an ``nbytes()`` method, e.g. to
+    leave out data they share with other sessions.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen or isinstance(value, _SHARED_TYPES):
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if callable(getattr(value, 'nbytes', None)):
+        return value.nbytes()
+    if hasattr(value, 'to_plotly_json'):
+        return deep_sizeof(value.to_plotly_json(), seen)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += deep_sizeof(vars(value), seen)
+    return size
+
+
+def memory_report(state):
+    """Bytes held per session-state key (measured deeply), largest first."""
+    rows = []
+    for key in state:
+        value = state[key]
+        rows.append({'Key': key, 'Type': 'DataFrame' if isinstance(value, pd.DataFrame) else type(value).__name__,
+                     'Rows': len(value) if hasattr(value, '__len__') else 1,
+                     'Bytes': deep_sizeof(value)})
+    return pd.DataFrame(rows, columns=['Key', 'Type', 'Rows', 'Bytes']).sort_values('Bytes', ascending=False)
@@ -0,0 +1,278 @@
+"""
+Concurrent-session load test for Tradingapp.py.
+
+Drives N simulated users through the real script with Streamlit's headless
+AppTest runner: register + OTP, login, market search, trade search + BUY,
+add funds and a final refresh (every tab renders on each rerun). Market data
+comes from a deterministic stub so runs are repeatable and never hit Yahoo.
+
+Usage:
+    python loadtest.py --sessions 1 5 10 25 --concurrency 8
+    python loadtest.py --compare-layouts --universe 500
+
+Reports p50/p95/p99 rerun latency, throughput and memory per session for each N.
+One session runs serially first to warm the script cache, and heap growth is
+traced in its own serial pass so tracemalloc never slows the timed runs.
+--compare-layouts instead times the Market tab search results in the
+per-row widget layout against the single-table layout (MARKET_LAYOUT) and
+reports the element count and serialized payload the browser receives.
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from history_store import memory_report
+
+UX_SLEEP_SECONDS = 0.1
+HEAP_SAMPLE_SESSIONS = 2
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tradingapp.py')
+
+
+# Stubbed market data provider
+def _stub_bars(symbol, period='1d', interval='1m'):
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    periods = 375 if interval == '1m' else 30
+    freq = '1min' if interval == '1m' else '1D'
+    index = pd.date_range(end=pd.Timestamp.now(tz='Asia/Kolkata').floor('min'), periods=periods, freq=freq)
+    close = 100 + rng.uniform(0, 2900) * np.exp(np.cumsum(rng.normal(0, 0.001, periods)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'Open': open_, 'High': np.maximum(open_, close) * 1.001,
+        'Low': np.minimum(open_, close) * 0.999, 'Close': close,
+        'Volume': rng.integers(1_000, 100_000, periods)
+    }, index=index)
+
+
+class StubTicker:
+    def __init__(self, symbol):
+        self.ticker = symbol
+
+    @property
+    def info(self):
+        return {'symbol': self.ticker, 'longName': self.ticker, 'currency': 'INR'}
+
+    def history(self, period='1d', interval='1m', **kwargs):
+        return _stub_bars(self.ticker, period, interval)
+
+
+def _stub_download(tickers, period='1d', interval='1m', **kwargs):
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    return pd.concat({t: _stub_bars(t, period, interval) for t in tickers}, axis=1)
+
+
+def install_stubs(skip_sleeps=True):
+    import yfinance as yf
+
+    yf.Ticker = StubTicker
+    yf.download = _stub_download
+    # Keep workers off any real shared-memory quote table
+    os.environ['QUOTE_SHM_NAME'] = 'loadtest_no_quotes'
+    if skip_sleeps:
+        # The app sleeps 0.5-2s after actions purely for UX; that is not server cost.
+        # Short sleeps stay real: AppTest's own 1 ms polling loop would busy-spin otherwise.
+        real_sleep = time.sleep
+        time.sleep = lambda seconds: real_sleep(seconds) if seconds < UX_SLEEP_SECONDS else None
+
+
+def grow_universe(n):
+    """Pad the stock universe with synthetic '... Bank' listings so searches return ``n`` rows."""
+    from market_universe import NSE_STOCKS, BSE_STOCKS
+
+    for i in range(n // 2):
+        NSE_STOCKS.setdefault(f'LTBANK{i}.NS', f'Loadtest Bank {i} Ltd')
+        BSE_STOCKS.setdefault(f'LTBANK{i}.BO', f'Loadtest Bank {i} Ltd')
+
+
+# Widget helpers
+def _find(elements, label, startswith=False):
+    for element in elements:
+        if element.label == label or (startswith and element.label.startswith(label)):
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def _walk(node):
+    yield node
+    for child in getattr(node, 'children', {}).values():
+        yield from _walk(child)
+
+
+def payload_report(node):
+    """Element count and serialized proto bytes under an AppTest node (what a rerun ships to the browser)."""
+    nodes = [n for n in _walk(node) if not hasattr(n, 'children')]
+    size = sum(n.proto.ByteSize() for n in _walk(node) if getattr(n, 'proto', None) is not None)
+    return len(nodes), size
+
+
+class SimulatedSession:
+    def __init__(self, user_id, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.user_id = user_id
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.latencies = []
+        self.errors = 0
+
+    def step(self, action=None):
+        if action is not None:
+            action(self.at)
+        started = time.perf_counter()
+        self.at.run()
+        self.latencies.append(time.perf_counter() - started)
+        if self.at.exception:
+            self.errors += 1
+
+    def login(self):
+        email = f"loadtest{self.user_id}@example.com"
+        password = 'loadtest123'
+        phone = f"9{self.user_id:09d}"[:10]
+
+        self.step()
+        self.step(lambda at: _find(at.button, 'Register').click())
+
+        def fill_registration(at):
+            _find(at.text_input, '👤 Full Name').input(f"Load Test {self.user_id}")
+            _find(at.text_input, '📧 Email').input(email)
+            _find(at.text_input, '📱 Phone Number').input(phone)
+            _find(at.text_input, '🔒 Password').input(password)
+            _find(at.text_input, '🔒 Confirm Password').input(password)
+            _find(at.text_input, '🆔 PAN Number').input('ABCDE1234F')
+            _find(at.button, 'Send OTP').click()
+        self.step(fill_registration)
+
+        def verify(at):
+            _find(at.text_input, 'Enter 6-digit OTP').input(at.session_state['otp'])
+            _find(at.button, '✅ Verify OTP').click()
+        self.step(verify)
+
+        def login(at):
+            _find(at.text_input, '📧 Email').input(email)
+            _find(at.text_input, '🔒 Password').input(password)
+            _find(at.button, 'Login').click()
+        self.step(login)
+        return self
+
+    def run(self):
+        try:
+            self._trade()
+        except LookupError:
+            # A missing widget ends this session's script, not the whole run
+            self.errors += 1
+        return self
+
+    def _trade(self):
+        self.login()
+
+        # Add funds. The demo "Confirm payment" button is nested under the Pay
+        # button and can never be reached on a rerun, so credit the balance
+        # directly after driving the real order creation.
+        self.step(lambda at: _find(at.button, '💳 Pay with Razorpay').click())
+        self.at.session_state['balance'] = 1_000_000.0
+
+        self.step(lambda at: _find(at.text_input, '🔍 Search Stocks').input('BANK'))
+        self.step(lambda at: _find(at.text_input, 'Search stock to trade').input('TCS'))
+        self.step(lambda at: _find(at.button, 'Tata Consultancy', startswith=True).click())
+        self.step(lambda at: _find(at.button, '🛒 Buy').click())
+        self.step()
+        return self
+
+
+def warm_up(timeout=60):
+    """One serial session, so concurrent sessions don't race on the first script compile."""
+    session = SimulatedSession(0, timeout).run()
+    if session.errors:
+        raise RuntimeError(f"Warm-up session failed: {[e.value for e in session.at.exception]}")
+
+
+def heap_per_session(sessions=HEAP_SAMPLE_SESSIONS, timeout=60):
+    """Traced heap growth per session, measured serially and apart from the timed runs."""
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    results = [SimulatedSession(10_000 + i, timeout).run() for i in range(sessions)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return (current - baseline) / sessions / 1024 ** 2
+
+
+def run_load(sessions, concurrency, timeout=60):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: SimulatedSession(i, timeout).run(), range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([lat for r in results for lat in r.latencies]) * 1000
+    state_bytes = [memory_report(r.at.session_state)['Bytes'].sum() for r in results]
+    return {
+        'Sessions': sessions,
+        'Reruns': len(latencies),
+        'Errors': sum(r.errors for r in results),
+        'p50 ms': np.percentile(latencies, 50),
+        'p95 ms': np.percentile(latencies, 95),
+        'p99 ms': np.percentile(latencies, 99),
+        'Reruns/s': len(latencies) / elapsed,
+        'State KB/session': np.mean(state_bytes) / 1024,
+    }
+
+
+def compare_layouts(layouts=('rows', 'table'), query='BANK', reruns=10, timeout=60):
+    rows = []
+    for layout in layouts:
+        os.environ['MARKET_LAYOUT'] = layout
+        session = SimulatedSession(0, timeout).login()
+        session.step(lambda at: _find(at.text_input, '🔍 Search Stocks').input(query))
+        session.latencies = []
+        for _ in range(reruns):
+            session.step()
+        market = session.at.tabs[0]
+        elements, size = payload_report(market)
+        # The watchlist board is also a dataframe; the results table is the last one
+        shown = len(market.dataframe[-1].value) if layout == 'table' else \
+            sum(1 for b in market.button if b.label == '➕')
+        latencies = np.array(session.latencies) * 1000
+        rows.append({
+            'Layout': layout,
+            'Stocks shown': shown,
+            'Market elements': elements,
+            'Market KB': size / 1024,
+            'Page KB': payload_report(session.at._tree)[1] / 1024,
+            'p50 ms': np.percentile(latencies, 50),
+            'p95 ms': np.percentile(latencies, 95),
+            'Errors': session.errors,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test Tradingapp.py with simulated sessions")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 25])
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count())
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--keep-sleeps', action='store_true', help="Keep the app's UX sleeps in the timings")
+    parser.add_argument('--compare-layouts', action='store_true', help="Compare Market tab layouts instead")
+    parser.add_argument('--universe', type=int, default=0, help="Pad the universe with N synthetic stocks")
+    args = parser.parse_args()
+
+    install_stubs(skip_sleeps=not args.keep_sleeps)
+    grow_universe(args.universe)
+    warm_up(args.timeout)
+    if args.compare_layouts:
+        rows = compare_layouts(timeout=args.timeout)
+    else:
+        rows = [run_load(n, args.concurrency, args.timeout) for n in args.sessions]
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:,.1f}"))
+    if not args.compare_layouts:
+        print(f"Heap MB/session (traced separately over {HEAP_SAMPLE_SESSIONS} sessions): "
+              f"{heap_per_session(timeout=args.timeout):,.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+Stock universe shared by the Streamlit app and its background processes
+"""
+
+# Import all stocks from stock database
+try:
+    from stock_database import ALL_NSE_STOCKS, ALL_BSE_STOCKS, STOCK_CATEGORIES
+    NSE_STOCKS = ALL_NSE_STOCKS
+    BSE_STOCKS = ALL_BSE_STOCKS
+except ImportError:
+    # Fallback to basic stocks if database not available
+    NSE_STOCKS = {
+        'RELIANCE.NS': 'Reliance Industries Ltd', 'TCS.NS': 'Tata Consultancy Services Ltd',
+        'HDFCBANK.NS': 'HDFC Bank Ltd', 'INFY.NS': 'Infosys Ltd',
+        'ICICIBANK.NS': 'ICICI Bank Ltd', 'SBIN.NS': 'State Bank of India',
+    }
+    BSE_STOCKS = {k.replace('.NS', '.BO'): v for k, v in NSE_STOCKS.items()}
+    STOCK_CATEGORIES = {}
+
+INDICES = {'^NSEI': 'NIFTY 50', '^BSESN': 'SENSEX', '^NSEBANK': 'NIFTY BANK'}
+
+def all_symbols():
+    """Every tradable symbol plus the indices, in a stable order."""
+    return sorted(set(NSE_STOCKS) | set(BSE_STOCKS) | set(INDICES))
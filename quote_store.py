@@ -0,0 +1,258 @@
+"""
+Shared-memory quote table for running several Streamlit workers on one host.
+
+One writer process (``python quote_store.py``) polls yfinance for the whole
+stock universe in batches and publishes the latest quotes into a fixed-layout
+numpy array in ``multiprocessing.shared_memory``. Every Streamlit worker
+attaches read-only and reads lock-free, so upstream load stays constant no
+matter how many workers sit behind the load balancer.
+
+Consistency uses a sequence counter (seqlock): the writer makes the counter
+odd before touching the data and even again once it is done. Readers retry
+when they see an odd counter or when it changed while they were copying.
+
+Layout of the segment::
+
+    header   int64[4]            MAGIC, SEQ, COUNT, UPDATED_AT
+    quotes   float64[COUNT, 5]   PRICE, PREV_CLOSE, CHANGE_PCT, VOLUME, UPDATED_AT
+    symbols  S24[COUNT]          row -> symbol, so readers build the same index
+"""
+
+import argparse
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_SHM_NAME = 'trading_app_quotes'
+MAGIC = 0x51554F5445  # "QUOTE"
+SYMBOL_WIDTH = 24
+MAX_READ_RETRIES = 100
+# A segment whose writer has not published for this long is treated as abandoned
+STALE_AFTER_SECONDS = 120
+
+# Header slots
+H_MAGIC, H_SEQ, H_COUNT, H_UPDATED_AT = range(4)
+HEADER_SLOTS = 4
+
+# Quote columns
+PRICE, PREV_CLOSE, CHANGE_PCT, VOLUME, UPDATED_AT = range(5)
+QUOTE_FIELDS = ('price', 'prev_close', 'change_pct', 'volume', 'updated_at')
+
+
+def _segment_size(count):
+    return HEADER_SLOTS * 8 + count * len(QUOTE_FIELDS) * 8 + count * SYMBOL_WIDTH
+
+
+def _attach_untracked(name):
+    # Readers must not let the resource tracker unlink the writer's segment on exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _remove_stale(name, stale_after):
+    """Unlink a segment left by a writer that was killed before it could clean up.
+
+    Raises FileExistsError while its writer is still publishing, or if the
+    segment is not a quote table.
+    """
+    try:
+        existing = QuoteTable.attach(name)
+    except FileNotFoundError:
+        return
+    except (ValueError, TypeError):
+        raise FileExistsError(f"Shared memory segment '{name}' exists and is not a quote table")
+    age = time.time() - existing.updated_at
+    shm = existing.shm
+    existing.close()
+    if age < stale_after:
+        raise FileExistsError(f"Quote table '{name}' was updated {age:.0f}s ago; another writer is running")
+    # Readers still mapping it keep their copy until get_quote_table re-attaches
+    shm.unlink()
+
+
+class QuoteTable:
+    """Fixed-layout quote array in shared memory, keyed by a symbol-index map."""
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self._header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        if self._header[H_MAGIC] != MAGIC:
+            raise ValueError(f"Shared memory segment '{shm.name}' is not a quote table")
+        count = int(self._header[H_COUNT])
+        offset = HEADER_SLOTS * 8
+        self._quotes = np.ndarray((count, len(QUOTE_FIELDS)), dtype=np.float64,
+                                  buffer=shm.buf, offset=offset)
+        offset += self._quotes.nbytes
+        self._symbols = np.ndarray((count,), dtype=f'S{SYMBOL_WIDTH}', buffer=shm.buf, offset=offset)
+        self.symbols = [s.decode() for s in self._symbols]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def create(cls, symbols, name=DEFAULT_SHM_NAME, stale_after=STALE_AFTER_SECONDS):
+        symbols = list(symbols)
+        size = _segment_size(len(symbols))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            _remove_stale(name, stale_after)
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        # Stamped at creation so a writer still on its first fetch doesn't look abandoned
+        header[:] = (MAGIC, 0, len(symbols), int(time.time()))
+        names = np.ndarray((len(symbols),), dtype=f'S{SYMBOL_WIDTH}', buffer=shm.buf,
+                           offset=HEADER_SLOTS * 8 + len(symbols) * len(QUOTE_FIELDS) * 8)
+        names[:] = [s.encode()[:SYMBOL_WIDTH] for s in symbols]
+        quotes = np.ndarray((len(symbols), len(QUOTE_FIELDS)), dtype=np.float64,
+                            buffer=shm.buf, offset=HEADER_SLOTS * 8)
+        quotes[:] = np.nan
+        del header, names, quotes
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_SHM_NAME):
+        return cls(_attach_untracked(name))
+
+    @property
+    def sequence(self):
+        return int(self._header[H_SEQ])
+
+    @property
+    def updated_at(self):
+        return int(self._header[H_UPDATED_AT])
+
+    # Writer side
+    def publish(self, quotes):
+        """Replace the whole table in one sequence bump."""
+        self._header[H_SEQ] += 1
+        self._quotes[:] = quotes
+        self._header[H_UPDATED_AT] = int(time.time())
+        self._header[H_SEQ] += 1
+
+    def update(self, rows, quotes):
+        """Overwrite selected rows (array of row indices) in one sequence bump."""
+        self._header[H_SEQ] += 1
+        self._quotes[rows] = quotes
+        self._header[H_UPDATED_AT] = int(time.time())
+        self._header[H_SEQ] += 1
+
+    # Reader side
+    def _read(self, rows):
+        for _ in range(MAX_READ_RETRIES):
+            start = int(self._header[H_SEQ])
+            if start & 1:
+                time.sleep(0)
+                continue
+            values = self._quotes[rows].copy()
+            if int(self._header[H_SEQ]) == start:
+                return values
+        return None
+
+    def snapshot(self):
+        """Consistent copy of every quote, or None if the writer kept us out."""
+        return self._read(slice(None))
+
+    def get(self, symbol, max_age=60):
+        """Latest quote for ``symbol`` as a dict, or None if unknown or stale."""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        values = self._read(row)
+        if values is None or np.isnan(values[PRICE]):
+            return None
+        if max_age and time.time() - values[UPDATED_AT] > max_age:
+            return None
+        return dict(zip(QUOTE_FIELDS, values.tolist()))
+
+    def get_many(self, symbols, max_age=60):
+        """Quotes for several symbols from a single consistent read."""
+        rows = [self.index[s] for s in symbols if s in self.index]
+        values = self._read(np.asarray(rows, dtype=np.intp))
+        if values is None:
+            return {}
+        now = time.time()
+        quotes = {}
+        for row, quote in zip(rows, values):
+            if np.isnan(quote[PRICE]) or (max_age and now - quote[UPDATED_AT] > max_age):
+                continue
+            quotes[self.symbols[row]] = dict(zip(QUOTE_FIELDS, quote.tolist()))
+        return quotes
+
+    def close(self):
+        del self._header, self._quotes, self._symbols
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _wide(data, field):
+    """One field as a time x symbol frame, for grouped or single-ticker downloads."""
+    if hasattr(data.columns, 'levels'):
+        return data.xs(field, axis=1, level=1)
+    return None
+
+
+def fetch_quotes(symbols):
+    """Batched 1-minute download; returns {symbol: quote row} for symbols with data."""
+    import yfinance as yf
+
+    symbols = list(symbols)
+    data = yf.download(symbols, period='1d', interval='1m', group_by='ticker',
+                       threads=True, progress=False)
+    now = time.time()
+    if data is None or data.empty:
+        return {}
+    close = _wide(data, 'Close')
+    if close is None:
+        close = data[['Close']].set_axis(symbols[:1], axis=1)
+        volume = data[['Volume']].set_axis(symbols[:1], axis=1)
+    else:
+        volume = _wide(data, 'Volume')
+    # Whole batch in a few column-wise reductions rather than a pass per symbol
+    valid = close.notna()
+    has_data = valid.any()
+    close, volume, valid = close.loc[:, has_data], volume.loc[:, has_data], valid.loc[:, has_data]
+    current = close.ffill().iloc[-1].to_numpy(dtype=float)
+    prev = close.bfill().iloc[0].to_numpy(dtype=float)
+    change = np.divide((current - prev) * 100, prev, out=np.zeros_like(current), where=prev != 0)
+    volumes = volume.where(valid).sum().to_numpy(dtype=float)
+    return {symbol: (float(current[i]), float(prev[i]), float(change[i]), float(volumes[i]), now)
+            for i, symbol in enumerate(close.columns)}
+
+
+def run_writer(name=DEFAULT_SHM_NAME, interval=10, batch_size=100):
+    from market_universe import all_symbols
+
+    table = QuoteTable.create(all_symbols(), name=name, stale_after=max(STALE_AFTER_SECONDS, 6 * interval))
+    print(f"Publishing {len(table.symbols)} symbols to shared memory '{name}' every {interval}s")
+    try:
+        while True:
+            started = time.monotonic()
+            latest = table.snapshot()
+            for i in range(0, len(table.symbols), batch_size):
+                batch = table.symbols[i:i + batch_size]
+                try:
+                    for symbol, row in fetch_quotes(batch).items():
+                        latest[table.index[symbol]] = row
+                except Exception as e:
+                    print(f"Fetch failed for batch {i // batch_size}: {e}")
+            table.publish(latest)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Publish live quotes to shared memory")
+    parser.add_argument('--name', default=DEFAULT_SHM_NAME)
+    parser.add_argument('--interval', type=float, default=10)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+    run_writer(args.name, args.interval, args.batch_size)
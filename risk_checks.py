@@ -0,0 +1,192 @@
+"""
+Pre-trade risk and margin checks over running per-account exposure aggregates.
+
+The book keeps cash, funds blocked for open orders, holdings, and exposure
+per symbol and per sector (from STOCK_CATEGORIES) up to date on every fill,
+so checking an order is a handful of dict lookups instead of a rescan of
+the portfolio.
+
+Benchmark:
+    python risk_checks.py --bench
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from market_universe import STOCK_CATEGORIES
+
+# Fraction of notional blocked as margin: delivery is fully funded, intraday gets 5x
+MARGIN_RATES = {'CNC': 1.0, 'MIS': 0.2}
+
+DEFAULT_LIMITS = {
+    'max_symbol_pct': 40.0,
+    'max_sector_pct': 60.0,
+    # Concentration limits only bite once the account is large enough to diversify
+    'concentration_floor': 100_000.0,
+    'max_order_value': None,
+}
+
+UNCLASSIFIED = 'Unclassified'
+
+RiskCheck = namedtuple('RiskCheck', ['ok', 'reason', 'margin'])
+
+
+def build_sector_map(categories=STOCK_CATEGORIES):
+    """Symbol -> sector for NSE symbols and their BSE twins."""
+    sectors = {}
+    for sector, symbols in categories.items():
+        for symbol in symbols:
+            sectors.setdefault(symbol, sector)
+            if symbol.endswith('.NS'):
+                sectors.setdefault(symbol[:-3] + '.BO', sector)
+    return sectors
+
+
+SECTOR_BY_SYMBOL = build_sector_map()
+
+
+class ExposureBook:
+    """Running exposure aggregates for one account; exposures are at cost."""
+
+    def __init__(self, cash=0.0, limits=None, sectors=None):
+        self.cash = float(cash)
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.sectors = SECTOR_BY_SYMBOL if sectors is None else sectors
+        self.blocked = 0.0
+        self.holdings = {}
+        self.blocked_qty = {}
+        self.symbol_exposure = {}
+        self.sector_exposure = {}
+        self.gross_exposure = 0.0
+        self.open_orders = {}
+
+    @classmethod
+    def from_portfolio(cls, cash, portfolio, limits=None):
+        book = cls(cash, limits)
+        for symbol, quantity, price in zip(portfolio['Symbol'].astype(str).tolist(),
+                                           portfolio['Quantity'].tolist(), portfolio['Buy Price'].tolist()):
+            book._add_position(symbol, quantity, quantity * price)
+        return book
+
+    @property
+    def available(self):
+        return self.cash - self.blocked
+
+    @property
+    def equity(self):
+        return self.cash + self.gross_exposure
+
+    def _add_position(self, symbol, quantity, value):
+        sector = self.sectors.get(symbol, UNCLASSIFIED)
+        self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
+        self.symbol_exposure[symbol] = self.symbol_exposure.get(symbol, 0.0) + value
+        self.sector_exposure[sector] = self.sector_exposure.get(sector, 0.0) + value
+        self.gross_exposure += value
+        if not self.holdings[symbol]:
+            del self.holdings[symbol], self.symbol_exposure[symbol]
+
+    def check(self, symbol, side, quantity, price, product='CNC'):
+        """O(1) pre-trade check; returns RiskCheck(ok, reason, margin)."""
+        notional = quantity * price
+        limits = self.limits
+        if limits['max_order_value'] and notional > limits['max_order_value']:
+            return RiskCheck(False, f"Order value ₹{notional:,.2f} exceeds limit ₹{limits['max_order_value']:,.2f}", 0.0)
+
+        if side == 'SELL':
+            sellable = self.holdings.get(symbol, 0) - self.blocked_qty.get(symbol, 0)
+            if quantity > sellable:
+                return RiskCheck(False, f"Cannot sell {quantity}: only {sellable} shares available", 0.0)
+            return RiskCheck(True, '', 0.0)
+
+        margin = notional * MARGIN_RATES[product]
+        if margin > self.available:
+            return RiskCheck(False, f"Insufficient balance! Need ₹{margin:,.2f}, available ₹{self.available:,.2f}",
+                             margin)
+
+        # Buying converts cash into exposure, so equity is unchanged by the order itself
+        equity = self.equity
+        if equity > limits['concentration_floor']:
+            symbol_after = self.symbol_exposure.get(symbol, 0.0) + notional
+            if symbol_after > equity * limits['max_symbol_pct'] / 100:
+                return RiskCheck(False, f"{symbol} would be {symbol_after / equity:.0%} of the account "
+                                        f"(limit {limits['max_symbol_pct']:.0f}%)", margin)
+            sector = self.sectors.get(symbol, UNCLASSIFIED)
+            if sector != UNCLASSIFIED:
+                sector_after = self.sector_exposure.get(sector, 0.0) + notional
+                if sector_after > equity * limits['max_sector_pct'] / 100:
+                    return RiskCheck(False, f"{sector} would be {sector_after / equity:.0%} of the account "
+                                            f"(limit {limits['max_sector_pct']:.0f}%)", margin)
+        return RiskCheck(True, '', margin)
+
+    # Open orders block funds (BUY) or shares (SELL) until filled or cancelled
+    def block(self, order_id, symbol, side, quantity, price, product='CNC'):
+        if side == 'BUY':
+            amount = quantity * price * MARGIN_RATES[product]
+            self.blocked += amount
+        else:
+            amount = 0.0
+            self.blocked_qty[symbol] = self.blocked_qty.get(symbol, 0) + quantity
+        self.open_orders[order_id] = (symbol, side, quantity, amount)
+
+    def release(self, order_id):
+        symbol, side, quantity, amount = self.open_orders.pop(order_id)
+        if side == 'BUY':
+            self.blocked -= amount
+        else:
+            self.blocked_qty[symbol] -= quantity
+            if not self.blocked_qty[symbol]:
+                del self.blocked_qty[symbol]
+
+    def on_fill(self, symbol, side, quantity, price):
+        if side == 'BUY':
+            self.cash -= quantity * price
+            self._add_position(symbol, quantity, quantity * price)
+        else:
+            held = self.holdings.get(symbol, 0)
+            cost = self.symbol_exposure.get(symbol, 0.0) * quantity / held if held else 0.0
+            self.cash += quantity * price
+            self._add_position(symbol, -quantity, -cost)
+
+    def nbytes(self):
+        """Approximate memory held by this book; the sector map is shared and not counted."""
+        total = sys.getsizeof(self)
+        for mapping in (self.holdings, self.blocked_qty, self.symbol_exposure, self.sector_exposure,
+                        self.open_orders, self.limits):
+            total += sys.getsizeof(mapping) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in mapping.items())
+        return total
+
+    def deposit(self, amount):
+        self.cash += amount
+
+    def withdraw(self, amount):
+        self.cash -= amount
+
+
+def benchmark(n_checks=1_000_000, n_symbols=500):
+    import numpy as np
+
+    rng = np.random.default_rng(3)
+    symbols = [f'SYM{i}.NS' for i in range(n_symbols)]
+    sectors = {s: f'Sector {i % 12}' for i, s in enumerate(symbols)}
+    book = ExposureBook(cash=10_000_000, sectors=sectors)
+    for symbol in symbols[:200]:
+        book.on_fill(symbol, 'BUY', 100, 500.0)
+    picks = rng.integers(0, n_symbols, n_checks).tolist()
+    sides = np.where(rng.random(n_checks) < 0.5, 'BUY', 'SELL').tolist()
+    qty = rng.integers(1, 200, n_checks).tolist()
+    price = rng.uniform(100, 3000, n_checks).tolist()
+    started = time.perf_counter()
+    for i in range(n_checks):
+        book.check(symbols[picks[i]], sides[i], qty[i], price[i])
+    return n_checks / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-trade risk check benchmark")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--checks', type=int, default=1_000_000)
+    args = parser.parse_args()
+    if args.bench:
+        print(f"{benchmark(args.checks):,.0f} checks/s/core")
@@ -0,0 +1,241 @@
+"""
+Accelerated replay of recorded NSE sessions for paper trading.
+
+Recorded bars live in ``<REPLAY_DIR>/<YYYY-MM-DD>/<SYMBOL>.csv`` in yfinance's
+history CSV layout (Datetime, Open, High, Low, Close, Volume). A producer
+thread streams them lazily, in chunks per file merged by timestamp, into a
+bounded queue. When the UI falls behind the queue fills and the producer
+blocks (backpressure), so a 60x fast-forward never loads a whole day into
+memory or floods a rerun. A replay clock maps wall time to session time at
+1x-60x. With ``manual=True`` it only moves on ``advance()``, which makes
+runs deterministic for reproducing performance problems.
+
+Record today's bars, then step deterministically through the first 90 minutes:
+    python session_replay.py record RELIANCE.NS TCS.NS
+    python session_replay.py replay replays/2026-10-19 --minutes 90 --step 60
+"""
+
+import argparse
+import heapq
+import os
+import queue
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from tick_stream import CandleAggregator
+
+REPLAY_DIR = os.environ.get('REPLAY_DIR', 'replays')
+MIN_SPEED, MAX_SPEED = 1, 60
+QUEUE_BARS = 2000
+POLL_MAX_BARS = 500
+CHUNK_ROWS = 5000
+
+
+def available_sessions(root=REPLAY_DIR):
+    """Recorded session dates (directories holding bar CSVs), newest first."""
+    if not os.path.isdir(root):
+        return []
+    sessions = [d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))
+                and any(name.endswith('.csv') for name in os.listdir(os.path.join(root, d)))]
+    return sorted(sessions, reverse=True)
+
+
+def record_session(symbols, root=REPLAY_DIR, period='1d', interval='1m'):
+    """Save the latest session's bars for ``symbols`` from yfinance; returns the session directory."""
+    import yfinance as yf
+
+    session_dir = None
+    for symbol in symbols:
+        data = yf.Ticker(symbol).history(period=period, interval=interval)
+        if data.empty:
+            continue
+        session_dir = session_dir or os.path.join(root, data.index[-1].strftime('%Y-%m-%d'))
+        os.makedirs(session_dir, exist_ok=True)
+        data[['Open', 'High', 'Low', 'Close', 'Volume']].to_csv(
+            os.path.join(session_dir, f'{symbol}.csv'), index_label='Datetime')
+    return session_dir
+
+
+def iter_bars(path, symbol, chunksize=CHUNK_ROWS):
+    """(ts, symbol, open, high, low, close, volume) tuples from one file, a chunk at a time."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        ts = pd.to_datetime(chunk['Datetime'], utc=True).dt.as_unit('s').astype('int64').tolist()
+        yield from zip(ts, [symbol] * len(ts), chunk['Open'].tolist(), chunk['High'].tolist(),
+                       chunk['Low'].tolist(), chunk['Close'].tolist(), chunk['Volume'].tolist())
+
+
+def session_bars(session_dir, chunksize=CHUNK_ROWS):
+    """All symbols of a session merged lazily in timestamp order."""
+    streams = [iter_bars(os.path.join(session_dir, name), name[:-4], chunksize)
+               for name in sorted(os.listdir(session_dir)) if name.endswith('.csv')]
+    return heapq.merge(*streams, key=lambda bar: bar[0])
+
+
+def session_start(session_dir):
+    """Earliest bar timestamp across the session's files (reads one row per file)."""
+    starts = []
+    for name in os.listdir(session_dir):
+        if name.endswith('.csv'):
+            first = pd.read_csv(os.path.join(session_dir, name), nrows=1)
+            if not first.empty:
+                starts.append(int(pd.Timestamp(first['Datetime'].iloc[0]).timestamp()))
+    return min(starts) if starts else 0
+
+
+class ReplayClock:
+    """Session time running at ``speed`` x wall time; pausable, or manual for deterministic runs."""
+
+    def __init__(self, start, speed=1, manual=False):
+        self.manual = manual
+        self._base = float(start)
+        self._wall = time.monotonic()
+        self.speed = speed
+        self.paused = manual
+
+    def now(self):
+        if self.paused:
+            return self._base
+        return self._base + (time.monotonic() - self._wall) * self.speed
+
+    def _rebase(self):
+        self._base = self.now()
+        self._wall = time.monotonic()
+
+    def set_speed(self, speed):
+        self._rebase()
+        self.speed = max(MIN_SPEED, min(MAX_SPEED, speed))
+
+    def pause(self):
+        self._rebase()
+        self.paused = True
+
+    def resume(self):
+        if not self.manual:
+            self._wall = time.monotonic()
+            self.paused = False
+
+    def advance(self, seconds):
+        self._base += seconds
+
+
+def _produce(session_dir, bars, stop):
+    # Holds no reference to the ReplaySession, so a dropped session can be collected
+    for bar in session_bars(session_dir):
+        # Blocks while the queue is full: this is the backpressure on fast-forward
+        while not stop.is_set():
+            try:
+                bars.put(bar, timeout=0.2)
+                break
+            except queue.Full:
+                continue
+        if stop.is_set():
+            return
+    bars.put(None)
+
+
+class ReplaySession:
+    """Streams a recorded session into quotes and candles as the replay clock passes each bar."""
+
+    def __init__(self, session_dir, speed=1, manual=False, queue_bars=QUEUE_BARS):
+        self.session_dir = session_dir
+        self.clock = ReplayClock(session_start(session_dir), speed, manual)
+        self.aggregator = CandleAggregator(timeframes=('1m', '5m'))
+        self.quotes = {}
+        self.opens = {}
+        self.bars = 0
+        self.finished = False
+        self._queue = queue.Queue(maxsize=queue_bars)
+        self._pending = None
+        self._stop = threading.Event()
+        self._producer = threading.Thread(target=_produce, args=(session_dir, self._queue, self._stop),
+                                          daemon=True, name='session-replay')
+        # Sessions that end without stop() (expired, tab closed) still release the producer
+        weakref.finalize(self, self._stop.set)
+
+    @property
+    def running(self):
+        return not self._stop.is_set() and not self.finished
+
+    def start(self):
+        self._producer.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _next_bar(self, timeout):
+        if self._pending is None:
+            try:
+                self._pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            if self._pending is None:
+                self.finished = True
+        return self._pending
+
+    def poll(self, max_bars=POLL_MAX_BARS, timeout=0.0):
+        """Apply bars due by the replay clock, at most ``max_bars`` per call; returns how many.
+
+        A manual clock waits for the producer instead of timing out, so the
+        bars applied per poll are the same on every run.
+        """
+        now = self.clock.now()
+        if self.clock.manual:
+            timeout = None
+        applied = 0
+        while applied < max_bars and not self.finished:
+            bar = self._next_bar(timeout)
+            if bar is None or bar[0] > now:
+                break
+            self._pending = None
+            ts, symbol, open_, high, low, close, volume = bar
+            self.opens.setdefault(symbol, open_)
+            self.quotes[symbol] = {'price': close, 'prev_close': self.opens[symbol],
+                                   'change_pct': (close - self.opens[symbol]) / self.opens[symbol] * 100,
+                                   'volume': volume, 'updated_at': ts}
+            self.aggregator.on_bar(symbol, ts, open_, high, low, close, volume)
+            applied += 1
+        self.bars += applied
+        return applied
+
+    def session_time(self, tz='Asia/Kolkata'):
+        return pd.Timestamp(self.clock.now(), unit='s', tz='UTC').tz_convert(tz)
+
+
+def replay_for(session_dir, minutes, step=60, max_bars=POLL_MAX_BARS):
+    """Deterministic run: advance a manual clock ``step`` session-seconds per poll."""
+    replay = ReplaySession(session_dir, manual=True).start()
+    polls = []
+    for _ in range(int(minutes * 60 // step)):
+        if replay.finished:
+            break
+        replay.clock.advance(step)
+        started = time.perf_counter()
+        replay.poll(max_bars)
+        polls.append(time.perf_counter() - started)
+    replay.stop()
+    return replay, polls
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record and replay NSE sessions")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('symbols', nargs='+')
+    rec.add_argument('--root', default=REPLAY_DIR)
+    rep = sub.add_parser('replay')
+    rep.add_argument('session_dir')
+    rep.add_argument('--minutes', type=float, default=90)
+    rep.add_argument('--step', type=float, default=60, help="Session seconds per poll")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        print(f"Recorded to {record_session(args.symbols, args.root)}")
+    else:
+        replay, polls = replay_for(args.session_dir, args.minutes, args.step)
+        polls_ms = pd.Series(polls) * 1000
+        print(f"{replay.bars:,} bars up to {replay.session_time():%H:%M:%S} | "
+              f"poll p50 {polls_ms.median():.2f} ms, max {polls_ms.max():.2f} ms")
@@ -0,0 +1,192 @@
+"""
+FIFO tax-lot engine for capital gains reporting on listed Indian equity.
+
+Each symbol keeps a deque of open lots; a SELL consumes the oldest lots first
+and records one realized row per lot touched, with holding period and
+STCG/LTCG classification. Realized rows are appended to column lists until the
+caller takes them for its own history store; only the per-class totals stay in
+the book. Per-symbol quantity/cost totals are kept incrementally so unrealized
+P&L is a vectorized pass over positions.
+
+Benchmark:
+    python tax_lots.py --bench --fills 100000
+"""
+
+import argparse
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Listed equity held for more than 12 months is long term, counted in calendar dates in IST
+IST = timezone(timedelta(hours=5, minutes=30))
+
+REALIZED_COLUMNS = ['Symbol', 'Quantity', 'Buy Time', 'Sell Time', 'Buy Price', 'Sell Price',
+                    'P&L', 'Holding Days', 'Tax Class']
+
+
+def ist_date(ts):
+    return datetime.fromtimestamp(ts, IST).date()
+
+
+def ltcg_after(buy_date):
+    """Last date that is still short term: 12 calendar months on from the purchase date."""
+    try:
+        return buy_date.replace(year=buy_date.year + 1)
+    except ValueError:  # bought on 29 February
+        return buy_date.replace(year=buy_date.year + 1, day=28)
+
+
+class LotBook:
+    """Open FIFO lots per symbol, realized P&L totals and the realized rows not yet taken."""
+
+    def __init__(self):
+        self.lots = {}
+        self.quantity = {}
+        self.cost = {}
+        self.gains = {'STCG': 0.0, 'LTCG': 0.0}
+        self._realized = {col: [] for col in REALIZED_COLUMNS}
+
+    def buy(self, symbol, quantity, price, ts):
+        lots = self.lots.get(symbol)
+        if lots is None:
+            lots = self.lots[symbol] = deque()
+        buy_date = ist_date(ts)
+        lots.append([quantity, price, ts, buy_date, ltcg_after(buy_date)])
+        self.quantity[symbol] = self.quantity.get(symbol, 0) + quantity
+        self.cost[symbol] = self.cost.get(symbol, 0.0) + quantity * price
+
+    def sell(self, symbol, quantity, price, ts):
+        """Consume the oldest lots; returns the realized P&L of this sale."""
+        if quantity > self.quantity.get(symbol, 0):
+            raise ValueError(f"Cannot sell {quantity} {symbol}: only {self.quantity.get(symbol, 0)} held")
+        lots = self.lots[symbol]
+        realized = self._realized
+        total = 0.0
+        remaining = quantity
+        sell_date = ist_date(ts)
+        while remaining:
+            lot = lots[0]
+            lot_qty, buy_price, buy_ts, buy_date, short_term_until = lot
+            used = lot_qty if lot_qty <= remaining else remaining
+            pnl = (price - buy_price) * used
+            tax_class = 'LTCG' if sell_date > short_term_until else 'STCG'
+            realized['Symbol'].append(symbol)
+            realized['Quantity'].append(used)
+            realized['Buy Time'].append(buy_ts)
+            realized['Sell Time'].append(ts)
+            realized['Buy Price'].append(buy_price)
+            realized['Sell Price'].append(price)
+            realized['P&L'].append(pnl)
+            realized['Holding Days'].append((sell_date - buy_date).days)
+            realized['Tax Class'].append(tax_class)
+            self.gains[tax_class] += pnl
+            total += pnl
+            self.cost[symbol] -= used * buy_price
+            if used == lot_qty:
+                lots.popleft()
+            else:
+                lot[0] = lot_qty - used
+            remaining -= used
+        self.quantity[symbol] -= quantity
+        if not self.quantity[symbol]:
+            del self.lots[symbol], self.quantity[symbol], self.cost[symbol]
+        return total
+
+    def process_fills(self, fills):
+        """Apply a fills frame (Time, Symbol, Order Type, Quantity, Price) in time order."""
+        fills = fills.sort_values('Time', kind='stable')
+        for ts, symbol, side, quantity, price in zip(
+                fills['Time'].tolist(), fills['Symbol'].astype(object).tolist(), fills['Order Type'].tolist(),
+                fills['Quantity'].tolist(), fills['Price'].tolist()):
+            if side == 'BUY':
+                self.buy(symbol, quantity, price, ts)
+            else:
+                self.sell(symbol, quantity, price, ts)
+
+    @classmethod
+    def from_orders(cls, orders):
+        book = cls()
+        executed = orders[orders['Status'] == 'Executed']
+        if not executed.empty:
+            book.process_fills(executed)
+        return book
+
+    def realized(self):
+        """Realized rows recorded since the last take_realized()."""
+        frame = pd.DataFrame(self._realized, columns=REALIZED_COLUMNS)
+        return frame.astype({'Quantity': 'int64', 'Buy Time': 'int64', 'Sell Time': 'int64',
+                             'Buy Price': 'float64', 'Sell Price': 'float64', 'P&L': 'float64',
+                             'Holding Days': 'int64', 'Tax Class': 'category'})
+
+    def take_realized(self):
+        """Hand the pending realized rows to the caller and drop them from the book."""
+        frame = self.realized()
+        self._realized = {col: [] for col in REALIZED_COLUMNS}
+        return frame
+
+    def realized_summary(self):
+        """Realized P&L per tax class, over every sale including rows already taken."""
+        return dict(self.gains)
+
+    def positions(self):
+        symbols = list(self.quantity)
+        return pd.DataFrame({
+            'Symbol': symbols,
+            'Quantity': np.fromiter((self.quantity[s] for s in symbols), dtype=np.int64, count=len(symbols)),
+            'Cost': np.fromiter((self.cost[s] for s in symbols), dtype=np.float64, count=len(symbols)),
+        })
+
+    def unrealized(self, prices):
+        """Mark open positions to ``prices`` (mapping or Series symbol -> price) in one vectorized pass."""
+        book = self.positions()
+        marks = book['Symbol'].map(prices).astype('float64')
+        book['Avg Cost'] = book['Cost'] / book['Quantity']
+        book['Price'] = marks
+        book['Value'] = marks * book['Quantity']
+        book['Unrealized P&L'] = book['Value'] - book['Cost']
+        return book
+
+
+def benchmark(n_fills=100_000, n_symbols=50, seed=11):
+    rng = np.random.default_rng(seed)
+    start = 1_700_000_000
+    times = np.sort(rng.integers(start, start + 2 * 365 * 86400, n_fills))
+    symbols = np.array([f'SYM{i}.NS' for i in range(n_symbols)])[rng.integers(0, n_symbols, n_fills)]
+    quantity = rng.integers(1, 100, n_fills)
+    price = np.round(rng.uniform(100, 3000, n_fills), 2)
+    # Sell only what is held so every fill is valid
+    held = {}
+    sides = []
+    for symbol, qty in zip(symbols.tolist(), quantity.tolist()):
+        if held.get(symbol, 0) >= qty and rng.random() < 0.45:
+            held[symbol] -= qty
+            sides.append('SELL')
+        else:
+            held[symbol] = held.get(symbol, 0) + qty
+            sides.append('BUY')
+    fills = pd.DataFrame({'Time': times, 'Symbol': symbols, 'Order Type': sides,
+                          'Quantity': quantity, 'Price': price})
+
+    started = time.perf_counter()
+    book = LotBook()
+    book.process_fills(fills)
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    marks = pd.Series(rng.uniform(100, 3000, n_symbols), index=[f'SYM{i}.NS' for i in range(n_symbols)])
+    book.unrealized(marks)
+    mark_elapsed = time.perf_counter() - started
+    return n_fills, len(book._realized['P&L']), elapsed, mark_elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="FIFO lot engine benchmark")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--fills', type=int, default=100_000)
+    args = parser.parse_args()
+    if args.bench:
+        fills, realized, elapsed, mark_elapsed = benchmark(args.fills)
+        print(f"{fills:,} fills -> {realized:,} realized rows in {elapsed * 1000:,.0f} ms "
+              f"({fills / elapsed:,.0f} fills/s); unrealized mark in {mark_elapsed * 1000:,.2f} ms")
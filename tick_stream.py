@@ -0,0 +1,313 @@
+"""
+Tick ingestion and real-time candle aggregation.
+
+Ticks from a simulator or a replay file (stand-ins for an exchange feed) are
+folded into 1s/1m/5m OHLCV candles in place. Each symbol keeps one fixed-size
+ring buffer per timeframe, so memory stays flat however long the feed runs,
+and consumers only ever receive the candle that changed.
+
+Benchmark (ticks per second on one core):
+    python tick_stream.py --bench --ticks 1000000
+"""
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAMES = {'1s': 1, '1m': 60, '5m': 300}
+DEFAULT_CAPACITY = 600
+
+Candle = namedtuple('Candle', ['time', 'open', 'high', 'low', 'close', 'volume'])
+
+# Columns of CandleRing.ohlcv
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+class CandleRing:
+    """Fixed-size ring of candles for one symbol and timeframe."""
+
+    def __init__(self, seconds, capacity=DEFAULT_CAPACITY):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.ohlcv = np.zeros((capacity, 5), dtype=np.float64)
+        self.head = -1
+        self.count = 0
+        # Current candle kept as Python floats so the per-tick path avoids numpy scalars
+        self._bucket = None
+        self._o = self._h = self._l = self._c = self._v = 0.0
+
+    def _flush(self):
+        self.times[self.head] = self._bucket
+        self.ohlcv[self.head] = (self._o, self._h, self._l, self._c, self._v)
+
+    def add(self, ts, price, qty):
+        """Fold one tick in. Returns True when it opened a new candle."""
+        bucket = int(ts) // self.seconds * self.seconds
+        if bucket == self._bucket:
+            if price > self._h:
+                self._h = price
+            elif price < self._l:
+                self._l = price
+            self._c = price
+            self._v += qty
+            return False
+        if self._bucket is not None and bucket < self._bucket:
+            return False  # late tick for a closed candle
+        if self._bucket is not None:
+            self._flush()
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._bucket = bucket
+        self._o = self._h = self._l = self._c = price
+        self._v = qty
+        return True
+
+    def add_bar(self, ts, open_, high, low, close, volume):
+        """Fold a recorded OHLCV bar in (bars at or below this ring's timeframe)."""
+        bucket = int(ts) // self.seconds * self.seconds
+        if bucket == self._bucket:
+            self._h = max(self._h, high)
+            self._l = min(self._l, low)
+            self._c = close
+            self._v += volume
+            return False
+        if self._bucket is not None and bucket < self._bucket:
+            return False
+        if self._bucket is not None:
+            self._flush()
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._bucket = bucket
+        self._o, self._h, self._l, self._c, self._v = open_, high, low, close, volume
+        return True
+
+    def add_batch(self, ts, price, qty):
+        """Fold a time-ordered batch of ticks in with numpy reductions."""
+        if len(ts) == 0:
+            return
+        buckets = ts.astype(np.int64) // self.seconds * self.seconds
+        if self._bucket is not None:
+            keep = buckets >= self._bucket
+            buckets, price, qty = buckets[keep], price[keep], qty[keep]
+            if len(buckets) == 0:
+                return
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        opens, closes = price[starts], price[ends]
+        highs = np.maximum.reduceat(price, starts)
+        lows = np.minimum.reduceat(price, starts)
+        volumes = np.add.reduceat(qty, starts)
+        first = 0
+        if buckets[0] == self._bucket:
+            self._h = max(self._h, float(highs[0]))
+            self._l = min(self._l, float(lows[0]))
+            self._c = float(closes[0])
+            self._v += float(volumes[0])
+            first = 1
+        if first == len(starts):
+            return
+        if self._bucket is not None:
+            self._flush()
+        new = len(starts) - first
+        # Only the newest `capacity` candles can survive the wrap-around
+        skip = max(0, new - self.capacity)
+        idx = (self.head + 1 + skip + np.arange(new - skip)) % self.capacity
+        sl = slice(first + skip, None)
+        self.times[idx] = buckets[starts[sl]]
+        self.ohlcv[idx] = np.column_stack([opens[sl], highs[sl], lows[sl], closes[sl], volumes[sl]])
+        self.head = int(idx[-1])
+        self.count = min(self.count + new, self.capacity)
+        self._bucket = int(self.times[self.head])
+        self._o, self._h, self._l, self._c, self._v = self.ohlcv[self.head].tolist()
+
+    def last(self):
+        if self._bucket is None:
+            return None
+        return Candle(self._bucket, self._o, self._h, self._l, self._c, self._v)
+
+    def to_frame(self, tz='Asia/Kolkata'):
+        """Candles oldest first, shaped like yfinance history for create_candlestick_chart."""
+        if self._bucket is None:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        self._flush()
+        order = (self.head - self.count + 1 + np.arange(self.count)) % self.capacity
+        index = pd.to_datetime(self.times[order], unit='s', utc=True).tz_convert(tz)
+        return pd.DataFrame(self.ohlcv[order], index=index, columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+
+class CandleAggregator:
+    """Per-symbol candle rings for every timeframe, with last-candle push to subscribers."""
+
+    def __init__(self, timeframes=tuple(TIMEFRAMES), capacity=DEFAULT_CAPACITY):
+        self.timeframes = {tf: TIMEFRAMES[tf] for tf in timeframes}
+        self.capacity = capacity
+        self.rings = {}
+        self.subscribers = []
+        self.ticks = 0
+        self.lock = threading.Lock()
+
+    def _rings_for(self, symbol):
+        rings = self.rings.get(symbol)
+        if rings is None:
+            rings = self.rings[symbol] = {tf: CandleRing(sec, self.capacity) for tf, sec in self.timeframes.items()}
+        return rings
+
+    def subscribe(self, callback):
+        """callback(symbol, timeframe, candle) is called with each updated last candle."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def _publish(self, symbol, rings):
+        for tf, ring in rings.items():
+            candle = ring.last()
+            for callback in self.subscribers:
+                callback(symbol, tf, candle)
+
+    def on_tick(self, symbol, ts, price, qty):
+        with self.lock:
+            rings = self._rings_for(symbol)
+            for ring in rings.values():
+                ring.add(ts, price, qty)
+            self.ticks += 1
+        if self.subscribers:
+            self._publish(symbol, rings)
+
+    def on_ticks(self, symbol, ts, price, qty):
+        """Batch of time-ordered ticks for one symbol; subscribers get one update per timeframe."""
+        with self.lock:
+            rings = self._rings_for(symbol)
+            for ring in rings.values():
+                ring.add_batch(ts, price, qty)
+            self.ticks += len(ts)
+        if self.subscribers:
+            self._publish(symbol, rings)
+
+    def on_bar(self, symbol, ts, open_, high, low, close, volume):
+        with self.lock:
+            rings = self._rings_for(symbol)
+            for ring in rings.values():
+                ring.add_bar(ts, open_, high, low, close, volume)
+        if self.subscribers:
+            self._publish(symbol, rings)
+
+    def last(self, symbol, timeframe='1m'):
+        rings = self.rings.get(symbol)
+        return rings[timeframe].last() if rings else None
+
+    def frame(self, symbol, timeframe='1m'):
+        rings = self.rings.get(symbol)
+        if not rings:
+            return None
+        with self.lock:
+            return rings[timeframe].to_frame()
+
+
+# Tick sources
+class TickSimulator:
+    """Random-walk ticks for a set of symbols, a stand-in for the exchange feed."""
+
+    def __init__(self, prices=None, ticks_per_second=5, volatility=0.0002, seed=None):
+        self.prices = dict(prices or {})
+        self.ticks_per_second = ticks_per_second
+        self.volatility = volatility
+        self.rng = np.random.default_rng(seed)
+
+    def track(self, symbol, price):
+        self.prices.setdefault(symbol, float(price))
+
+    def batch(self, now, seconds):
+        """Ticks for every tracked symbol over the last ``seconds``: {symbol: (ts, price, qty)}."""
+        n = max(1, int(self.ticks_per_second * seconds))
+        ticks = {}
+        for symbol, price in list(self.prices.items()):
+            ts = np.sort(now - seconds + self.rng.uniform(0, seconds, n))
+            path = price * np.exp(np.cumsum(self.rng.normal(0, self.volatility, n)))
+            qty = self.rng.integers(1, 500, n).astype(np.float64)
+            self.prices[symbol] = float(path[-1])
+            ticks[symbol] = (ts, path, qty)
+        return ticks
+
+
+def replay_ticks(path, chunksize=100_000):
+    """Stream (symbol, ts, price, qty) arrays per symbol from a CSV with ts,symbol,price,qty columns."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        for symbol, group in chunk.groupby('symbol', sort=False):
+            yield symbol, group['ts'].to_numpy(np.float64), group['price'].to_numpy(np.float64), \
+                group['qty'].to_numpy(np.float64)
+
+
+class TickFeed:
+    """Background thread pumping a tick source into an aggregator."""
+
+    def __init__(self, aggregator, simulator=None, replay_path=None, interval=0.25):
+        self.aggregator = aggregator
+        self.simulator = simulator
+        self.replay_path = replay_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name='tick-feed')
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        if self.replay_path:
+            for symbol, ts, price, qty in replay_ticks(self.replay_path):
+                if self.stop_event.is_set():
+                    return
+                self.aggregator.on_ticks(symbol, ts, price, qty)
+            return
+        while not self.stop_event.wait(self.interval):
+            for symbol, (ts, price, qty) in self.simulator.batch(time.time(), self.interval).items():
+                self.aggregator.on_ticks(symbol, ts, price, qty)
+
+
+def benchmark(n_ticks=1_000_000, n_symbols=50, seed=7):
+    rng = np.random.default_rng(seed)
+    symbols = [f'SYM{i}.NS' for i in range(n_symbols)]
+    ts = np.sort(rng.uniform(0, 3600, n_ticks)) + 1_700_000_000
+    price = 1000 * np.exp(np.cumsum(rng.normal(0, 0.0002, n_ticks)))
+    qty = rng.integers(1, 500, n_ticks).astype(np.float64)
+    owner = rng.integers(0, n_symbols, n_ticks)
+
+    results = {}
+    aggregator = CandleAggregator()
+    per_tick = min(n_ticks, 200_000)
+    ts_l, price_l, qty_l = ts[:per_tick].tolist(), price[:per_tick].tolist(), qty[:per_tick].tolist()
+    started = time.perf_counter()
+    for i, sym in enumerate(owner[:per_tick].tolist()):
+        aggregator.on_tick(symbols[sym], ts_l[i], price_l[i], qty_l[i])
+    results['per-tick'] = per_tick / (time.perf_counter() - started)
+
+    aggregator = CandleAggregator()
+    started = time.perf_counter()
+    for chunk in range(0, n_ticks, 100_000):
+        sl = slice(chunk, chunk + 100_000)
+        chunk_owner = owner[sl]
+        for sym in np.unique(chunk_owner):
+            mask = chunk_owner == sym
+            aggregator.on_ticks(symbols[sym], ts[sl][mask], price[sl][mask], qty[sl][mask])
+    results['batched'] = n_ticks / (time.perf_counter() - started)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tick aggregation benchmark")
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--ticks', type=int, default=1_000_000)
+    parser.add_argument('--symbols', type=int, default=50)
+    args = parser.parse_args()
+    if args.bench:
+        for mode, rate in benchmark(args.ticks, args.symbols).items():
+            print(f"{mode:>9}: {rate:,.0f} ticks/s/core")